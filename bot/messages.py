@@ -0,0 +1,131 @@
+"""Teks balasan bot (disimpan sebagai konstanta modul)."""
+import re
+from typing import Tuple
+from telegram import MessageEntity
+
+# Markup yang dipakai di teks statis: **tebal** dan `kode`
+_MARKUP_RE = re.compile(r'\*\*(.+?)\*\*|`(.+?)`', re.DOTALL)
+
+
+def _utf16_len(text: str) -> int:
+    """Panjang teks dalam UTF-16 code unit (satuan offset entity Telegram)."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def to_entities(markdown: str) -> Tuple[str, Tuple[MessageEntity, ...]]:
+    """Ubah teks **tebal**/`kode` jadi (teks polos, entities) tanpa parse_mode."""
+    plain = []
+    entities = []
+    offset = 0
+    pos = 0
+    
+    for match in _MARKUP_RE.finditer(markdown):
+        before = markdown[pos:match.start()]
+        plain.append(before)
+        offset += _utf16_len(before)
+        
+        if match.group(1) is not None:
+            content, entity_type = match.group(1), MessageEntity.BOLD
+        else:
+            content, entity_type = match.group(2), MessageEntity.CODE
+        
+        length = _utf16_len(content)
+        entities.append(MessageEntity(type=entity_type, offset=offset, length=length))
+        plain.append(content)
+        offset += length
+        pos = match.end()
+    
+    plain.append(markdown[pos:])
+    return ''.join(plain), tuple(entities)
+
+
+WELCOME_MESSAGE = (
+    "👋 **Halo! Selamat datang di Bot Keuangan!**\n\n"
+    "Aku bisa bantu kamu catat keuangan dengan mudah!\n\n"
+    "📝 **Cara pakai:**\n"
+    "Kirim pesan biasa aja, misalnya:\n"
+    "• Makan siang 25000\n"
+    "• Beli kopi 15rb\n"
+    "• Gaji 5jt\n"
+    "• Grab ke mall 20k\n\n"
+    "🕐 **Lupa nyatet transaksi hari lalu?**\n"
+    "• kemarin makan 25000\n"
+    "• 2 hari lalu beli kopi 15rb\n"
+    "• /add_past 10/01/2026 makan 25000\n\n"
+    "⚙️ **Command:**\n"
+    "/start - Mulai bot\n"
+    "/help - Lihat bantuan lengkap\n"
+    "/saldo - Cek saldo\n"
+)
+
+HELP_TEXT = (
+    "📚 **PANDUAN LENGKAP**\n\n"
+    "**Format Pesan:**\n"
+    "Kirim pesan natural aja, aku akan otomatis deteksi!\n\n"
+    "**Contoh Pengeluaran:**\n"
+    "• Makan siang 25000\n"
+    "• Beli baju 150rb\n"
+    "• Bensin 50k\n"
+    "• Bayar listrik 200ribu\n\n"
+    "**Contoh Pemasukan:**\n"
+    "• Gaji 5jt\n"
+    "• Terima transfer 500rb\n"
+    "• Bonus 1juta\n\n"
+    "**Format Angka:**\n"
+    "• 15000 atau 15rb atau 15k → Rp 15.000\n"
+    "• 1.5jt atau 1,5jt → Rp 1.500.000\n\n"
+    "🕐 **Catat Transaksi Hari Sebelumnya:**\n"
+    "Kamu bisa catat pengeluaran yang lupa dengan:\n"
+    "• `kemarin makan 25000` - Kemarin\n"
+    "• `2 hari lalu beli kopi 15rb` - 2 hari lalu\n"
+    "• `minggu lalu bensin 50rb` - Seminggu lalu\n"
+    "• `10/01/2026 makan 25000` - Tanggal spesifik (DD/MM/YYYY)\n"
+    "• `/add_past 10/01/2026 makan 25000` - Pakai command\n\n"
+    "Bot akan otomatis kategorikan transaksi kamu! 🎯"
+)
+
+SALDO_PLACEHOLDER = (
+    "💰 **SALDO KAMU**\n\n"
+    "🔜 Fitur ini sedang dalam pengembangan!\n"
+    "Akan segera terhubung dengan Google Sheets."
+)
+
+ADD_PAST_USAGE = (
+    "❌ Format: `/add_past DD/MM/YYYY deskripsi nominal`\n\n"
+    "Contoh:\n"
+    "`/add_past 10/01/2026 makan siang 25000`\n"
+    "`/add_past 09/01/2026 beli kopi 15rb`"
+)
+
+ADD_PAST_BAD_DATE = (
+    "❌ Format tanggal salah! Gunakan DD/MM/YYYY\n"
+    "Contoh: `10/01/2026`"
+)
+
+ADD_PAST_NO_AMOUNT = (
+    "❌ Maaf, nominal tidak ditemukan.\n"
+    "Contoh: `/add_past 10/01/2026 makan siang 25000`"
+)
+
+NO_AMOUNT_FOUND = (
+    "❌ Maaf, nominal tidak ditemukan.\n"
+    "Contoh: \"makan siang 25000\", \"beli kopi 15rb\", atau \"gaji 5jt\"."
+)
+
+SHEETS_QUEUED = "✅ Dicatat! Segera tersimpan ke Google Sheets."
+SHEETS_NOT_CONFIGURED = "ℹ️  Google Sheets belum dikonfigurasi (SPREADSHEET_ID/credentials.json)."
+
+ERROR_PROCESSING = "❌ Maaf, terjadi error saat memproses pesan. Coba lagi ya!"
+
+ERROR_GENERIC = (
+    "❌ Maaf, terjadi error!\n"
+    "Coba lagi atau hubungi admin."
+)
+
+# Versi siap kirim (teks polos + entities), di-parse sekali saat import
+WELCOME_REPLY = to_entities(WELCOME_MESSAGE)
+HELP_REPLY = to_entities(HELP_TEXT)
+SALDO_PLACEHOLDER_REPLY = to_entities(SALDO_PLACEHOLDER)
+ADD_PAST_USAGE_REPLY = to_entities(ADD_PAST_USAGE)
+ADD_PAST_BAD_DATE_REPLY = to_entities(ADD_PAST_BAD_DATE)
+ADD_PAST_NO_AMOUNT_REPLY = to_entities(ADD_PAST_NO_AMOUNT)
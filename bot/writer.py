@@ -0,0 +1,151 @@
+"""Antrian penulisan transaksi ke Google Sheets.
+
+Handler cukup memasukkan transaksi ke antrian, lalu worker di background
+menulis beberapa transaksi sekaligus dengan satu panggilan append_rows.
+Setiap transaksi juga dicatat di jurnal SQLite sampai berhasil tertulis,
+supaya tidak hilang kalau bot mati atau Sheets sedang gagal.
+"""
+import asyncio
+import logging
+from typing import Optional
+from telegram.ext import Application
+from models.transaction import Transaction
+from services.sheets import sheets_manager
+from services.journal import TransactionJournal
+from config.settings import Config
+from config.constants import (
+    SHEETS_FLUSH_INTERVAL_SECONDS,
+    SHEETS_FLUSH_MAX_BATCH,
+    SHEETS_RETRY_DELAY_SECONDS,
+    SHEETS_WRITE_RETRY_MAX_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+pending_tx_queue: Optional[asyncio.Queue] = None
+_worker_task: Optional[asyncio.Task] = None
+_connect_task: Optional[asyncio.Task] = None
+_stopping: Optional[asyncio.Event] = None
+# Dibuka di start_sheets_worker, bukan saat import (file SQLite dibuat di disk)
+_journal: Optional[TransactionJournal] = None
+
+# Penanda di antrian: worker selesai setelah semua transaksi sebelumnya tertulis
+_STOP = object()
+
+
+async def enqueue_transaction(transaction: Transaction):
+    """Catat transaksi di jurnal lalu masukkan ke antrian penulisan."""
+    # Insert SQLite (WAL) hanya butuh waktu sub-milidetik, cukup di event loop
+    journal_id = _journal.add(transaction)
+    await pending_tx_queue.put((journal_id, transaction))
+
+
+def _write_batch(batch: list) -> bool:
+    """Tulis batch (journal_id, transaksi) ke Sheets lalu hapus dari jurnal bila berhasil.
+    
+    Error apa pun dianggap gagal tulis (dicoba ulang worker), supaya worker tidak mati diam-diam.
+    """
+    try:
+        saved = sheets_manager.add_transactions([transaction for _, transaction in batch])
+    except Exception as e:
+        logger.error(f"❌ Error tak terduga saat menulis batch ke Sheets: {e}", exc_info=True)
+        return False
+    
+    if saved:
+        try:
+            _journal.mark_synced([journal_id for journal_id, _ in batch])
+        except Exception as e:
+            # Baris sudah tertulis, jadi batch tidak dikirim ulang sekarang
+            logger.error(f"❌ Gagal menghapus {len(batch)} transaksi dari jurnal: {e}", exc_info=True)
+    return saved
+
+
+def _drain_batch(first: tuple) -> list:
+    """Ambil transaksi yang sudah menunggu di antrian (maks SHEETS_FLUSH_MAX_BATCH)."""
+    batch = [first]
+    while len(batch) < SHEETS_FLUSH_MAX_BATCH:
+        try:
+            item = pending_tx_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        if item is _STOP:
+            # Tidak ada transaksi setelah penanda, kembalikan untuk putaran berikutnya
+            pending_tx_queue.put_nowait(_STOP)
+            break
+        batch.append(item)
+    return batch
+
+
+async def sheets_flush_worker():
+    """Worker yang mengosongkan antrian ke Google Sheets secara batch.
+
+    Berhenti sendiri setelah menerima _STOP, jadi tidak pernah dibatalkan
+    di tengah append_rows yang sedang berjalan di thread.
+    """
+    while True:
+        first = await pending_tx_queue.get()
+        if first is _STOP:
+            return
+
+        # Tunggu sebentar supaya burst pesan ikut masuk satu batch
+        if not _stopping.is_set():
+            await asyncio.sleep(SHEETS_FLUSH_INTERVAL_SECONDS)
+        batch = _drain_batch(first)
+
+        # Batch yang gagal dicoba ulang (backoff) sebelum transaksi berikutnya,
+        # supaya urutan baris tetap sama dengan urutan saldo
+        delay = SHEETS_RETRY_DELAY_SECONDS
+        while not await asyncio.to_thread(_write_batch, batch):
+            if _stopping.is_set():
+                # Sisanya tetap di jurnal dan dikirim ulang saat start berikutnya
+                logger.error(f"❌ Gagal menyimpan {len(batch)} transaksi saat berhenti (tetap di jurnal)")
+                return
+            logger.error(
+                f"❌ Gagal menyimpan {len(batch)} transaksi ke Google Sheets "
+                f"(tetap di jurnal), coba lagi dalam {delay} detik"
+            )
+            try:
+                # Bangun lebih cepat bila bot diminta berhenti
+                await asyncio.wait_for(_stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, SHEETS_WRITE_RETRY_MAX_SECONDS)
+
+
+async def start_sheets_worker(application: Application):
+    """Dipanggil saat bot mulai (post_init): siapkan antrian dan worker."""
+    global pending_tx_queue, _worker_task, _connect_task, _stopping, _journal
+
+    pending_tx_queue = asyncio.Queue()
+    _stopping = asyncio.Event()
+    _journal = await asyncio.to_thread(TransactionJournal, Config.TRANSACTION_JOURNAL_FILE)
+
+    # Transaksi yang belum tertulis dari run sebelumnya dikirim ulang lebih dulu.
+    # Saldonya dihitung ulang dari sheet sebelum bot menerima transaksi baru
+    leftover = await asyncio.to_thread(_journal.pending)
+    if leftover:
+        logger.info(f"📒 Mengirim ulang {len(leftover)} transaksi dari jurnal")
+        await asyncio.to_thread(sheets_manager.restore_pending, [transaction for _, transaction in leftover])
+        for item in leftover:
+            pending_tx_queue.put_nowait(item)
+
+    _worker_task = asyncio.create_task(sheets_flush_worker())
+    # Hubungkan ke Sheets di background supaya bot tidak menunggu saat start
+    _connect_task = asyncio.create_task(asyncio.to_thread(sheets_manager.ensure_connected))
+    logger.info("🧵 Worker penulisan Google Sheets berjalan")
+
+
+async def stop_sheets_worker(application: Application):
+    """Dipanggil saat bot berhenti (post_shutdown): tunggu worker mem-flush sisa antrian."""
+    if not _worker_task:
+        return
+
+    remaining = pending_tx_queue.qsize()
+    if remaining:
+        logger.info(f"💾 Menyimpan {remaining} transaksi tersisa sebelum berhenti...")
+
+    # Worker menyelesaikan batch yang sedang ditulis, lalu sisa antrian, lalu berhenti
+    _stopping.set()
+    pending_tx_queue.put_nowait(_STOP)
+    await _worker_task
+    _journal.close()
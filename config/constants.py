@@ -1,4 +1,8 @@
 """Konstanta aplikasi."""
+from datetime import timezone, timedelta
+
+# Timezone Indonesia (WIB)
+WIB = timezone(timedelta(hours=7))
 
 # Cache Settings
 CACHE_TIMEOUT_SECONDS = 60
@@ -14,11 +18,28 @@ MONTHLY_COMPARISON_DEFAULT_MONTHS = 3
 
 # API Settings
 API_DEFAULT_PORT = 8001
-CORS_ALLOWED_ORIGINS = ["http://localhost:*", "http://127.0.0.1:*"]  # For production, specify exact origins
+
+# Telegram HTTP Settings (batas koneksi & timeout ke Bot API)
+TELEGRAM_CONNECTION_POOL_SIZE = 100
+TELEGRAM_CONNECT_TIMEOUT_SECONDS = 5.0
+TELEGRAM_READ_TIMEOUT_SECONDS = 10.0
+TELEGRAM_WRITE_TIMEOUT_SECONDS = 10.0
+TELEGRAM_POOL_TIMEOUT_SECONDS = 1.0
 
 # Google Sheets Settings
 SHEETS_RETRY_ATTEMPTS = 3
 SHEETS_RETRY_DELAY_SECONDS = 2
+SHEETS_HTTP_POOL_SIZE = 4  # koneksi keep-alive ke Sheets API (worker + handler)
+SHEETS_FLUSH_INTERVAL_SECONDS = 0.5  # jeda untuk mengumpulkan burst transaksi
+SHEETS_FLUSH_MAX_BATCH = 50  # maksimal baris per append_rows
+SHEETS_WRITE_RETRY_MAX_SECONDS = 60  # jeda maksimal antar percobaan ulang batch yang gagal
+
+# Parser Settings
+PARSE_CACHE_SIZE = 4096  # jumlah teks pesan yang hasil parse-nya diingat
+
+# OCR Settings
+VISION_BATCH_SIZE = 16  # maksimal gambar per batch_annotate_images
+OCR_CACHE_SIZE = 256  # jumlah hasil OCR (per hash gambar) yang diingat
 
 # PDF Export Settings
 PDF_FONT = "Helvetica"
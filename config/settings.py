@@ -15,9 +15,19 @@ class Config:
         logger.warning("⚠️  TELEGRAM_TOKEN tidak ditemukan di .env!")
         logger.warning("Bot tidak akan bisa jalan sampai token diisi.")
     
+    # Webhook (opsional). Kalau TELEGRAM_WEBHOOK_URL kosong, bot pakai long-polling.
+    TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+    TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET') or None
+    TELEGRAM_WEBHOOK_LISTEN = os.getenv('TELEGRAM_WEBHOOK_LISTEN', '0.0.0.0')
+    TELEGRAM_WEBHOOK_PORT = int(os.getenv('TELEGRAM_WEBHOOK_PORT', '8443'))
+    
     # ========== GOOGLE SHEETS ==========
     SHEETS_CREDS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
     SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
+    # Penanda lokal bahwa header sheet sudah dicek (hemat satu request saat start)
+    SHEETS_HEADER_CACHE_FILE = os.getenv('SHEETS_HEADER_CACHE_FILE') or '.sheets_header.json'
+    # Jurnal SQLite untuk transaksi yang belum tertulis ke Sheets
+    TRANSACTION_JOURNAL_FILE = os.getenv('TRANSACTION_JOURNAL_FILE') or 'transactions_journal.db'
     
     # Validasi Spreadsheet ID
     if not SPREADSHEET_ID:
@@ -31,38 +41,38 @@ class Config:
     
     # Kategori Pengeluaran & Keywords untuk deteksi
     EXPENSE_KEYWORDS = {
-        'Makan': [
+        'Makan': frozenset({
             'makan', 'sarapan', 'lunch', 'dinner', 'nasi', 'ayam', 'soto', 'bakso', 
             'mie', 'kopi', 'teh', 'minum', 'snack', 'jajan', 'cemilan', 'food',
             'geprek', 'seblak', 'warteg', 'resto', 'restoran', 'cafe', 'kedai',
             'lapar', 'kenyang', 'minum', 'minuman'
-        ],
-        'Transport': [
+        }),
+        'Transport': frozenset({
             'transport', 'grab', 'gojek', 'ojek', 'taxi', 'angkot', 'bus',
             'bensin', 'parkir', 'tol', 'kereta', 'travel', 'pergi', 'pulang'
-        ],
-        'Belanja': [
+        }),
+        'Belanja': frozenset({
             'belanja', 'beli', 'baju', 'celana', 'sepatu', 'tas',
             'shopee', 'tokped', 'tokopedia', 'lazada', 'blibli', 'toko',
             'shopping', 'shop'
-        ],
-        'Tagihan': [
+        }),
+        'Tagihan': frozenset({
             'listrik', 'air', 'pdam', 'wifi', 'internet', 'pulsa', 'paket data',
             'token', 'bayar', 'cicilan', 'angsuran', 'pln', 'tagihan'
-        ],
-        'Hiburan': [
+        }),
+        'Hiburan': frozenset({
             'nonton', 'bioskop', 'film', 'game', 'main', 'liburan', 'wisata',
             'netflix', 'spotify', 'steam', 'tiket', 'jalan-jalan'
-        ],
-        'Kesehatan': [
+        }),
+        'Kesehatan': frozenset({
             'obat', 'dokter', 'rumah sakit', 'rs', 'klinik', 'vitamin',
             'apotek', 'medical', 'checkup', 'berobat', 'sakit'
-        ],
+        }),
     }
     
     # Keywords untuk Pemasukan
-    INCOME_KEYWORDS = [
+    INCOME_KEYWORDS = frozenset({
         'gaji', 'terima', 'transfer', 'bonus', 'freelance', 
         'pendapatan', 'dapat', 'masuk', 'bayaran', 'honor', 
         'untung', 'diterima', 'income'
-    ]
\ No newline at end of file
+    })
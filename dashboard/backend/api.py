@@ -1,21 +1,30 @@
+import asyncio
+import json
 import logging
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from fastapi.responses import Response, FileResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from gspread.urls import DRIVE_FILES_API_V3_URL
+from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta, date, timezone
+import re
 import secrets
+from functools import wraps
+from dataclasses import dataclass, field
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from array import array
 
 # Timezone Indonesia (WIB)
 WIB = timezone(timedelta(hours=7))
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 from dotenv import load_dotenv
 import time
-from io import BytesIO
 from fpdf import FPDF
 from pathlib import Path
 
@@ -46,7 +55,8 @@ app = FastAPI(
     title="Finance Dashboard API", 
     version="1.0",
     docs_url="/docs" if not IS_PRODUCTION else None,  # Disable docs in production
-    redoc_url="/redoc" if not IS_PRODUCTION else None
+    redoc_url="/redoc" if not IS_PRODUCTION else None,
+    default_response_class=ORJSONResponse  # orjson encodes large transaction lists much faster
 )
 
 # Serve static files (HTML frontend)
@@ -57,10 +67,47 @@ if os.path.exists(FRONTEND_DIR):
 else:
     logger.warning(f"⚠️ Frontend directory not found: {FRONTEND_DIR}")
 
+# ==========================================
+# HTTP CACHING (ETag)
+# ==========================================
+API_CACHE_CONTROL = "private, max-age=30, stale-while-revalidate=60"
+
+def current_etag() -> str:
+    """Weak ETag for the cached data (plus today's date, which summary/trends depend on)"""
+    today = datetime.now(tz=WIB).date().isoformat()
+    return f'W/"{_cache.get("_fetched_at", 0):.3f}-{today}"'
+
+# Registered before the CORS, rate-limit and security-header middlewares so it
+# runs inside them: its early 304s still get CORS and security headers and count
+# against the rate limit
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    """Answer repeated dashboard polls with 304 while the cached data is unchanged"""
+    if request.method != "GET" or not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    
+    # Taken before the handler runs: a refresh finishing meanwhile must not label
+    # the old body with the new ETag (at worst the next poll gets a 200 instead of 304)
+    etag = current_etag() if '_fetched_at' in _cache else None
+    
+    # Only trust the ETag when the handler would serve this exact cache
+    if etag and get_fresh_cached_data() is not None:
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": API_CACHE_CONTROL})
+    
+    response = await call_next(request)
+    
+    if response.status_code == 200 and etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = API_CACHE_CONTROL
+    
+    return response
+
 # ==========================================
 # CORS SECURITY - Strict origins only
 # ==========================================
 cors_origins_str = os.getenv('CORS_ORIGINS', '')
+ALLOWED_ORIGIN_REGEX = None
 
 if IS_PRODUCTION:
     # Production: Must specify exact origins, no wildcards
@@ -69,27 +116,30 @@ if IS_PRODUCTION:
         raise RuntimeError("CORS_ORIGINS not properly configured for production")
     ALLOWED_ORIGINS = [origin.strip() for origin in cors_origins_str.split(',')]
 else:
-    # Development: Allow localhost/127.0.0.1
+    # Development: Allow localhost/127.0.0.1 on any port
     if cors_origins_str and cors_origins_str != '*':
         ALLOWED_ORIGINS = [origin.strip() for origin in cors_origins_str.split(',')]
     else:
-        ALLOWED_ORIGINS = [
-            "http://localhost:8001",
-            "http://127.0.0.1:8001",
-            "http://localhost:5500",
-            "http://127.0.0.1:5500"
-        ]
+        ALLOWED_ORIGINS = []
+        ALLOWED_ORIGIN_REGEX = os.getenv(
+            'CORS_ORIGIN_REGEX',
+            r'^https?://(localhost|127\.0\.0\.1)(:\d+)?$'
+        )
 
-logger.info(f"🔒 CORS allowed origins: {ALLOWED_ORIGINS}")
+logger.info(f"🔒 CORS allowed origins: {ALLOWED_ORIGINS or ALLOWED_ORIGIN_REGEX}")
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
+    allow_origin_regex=ALLOWED_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["GET", "POST"],  # Restrict to needed methods only
     allow_headers=["Content-Type", "Authorization"],  # Specific headers only
 )
 
+# Compress larger JSON/PDF responses (e.g. /api/transactions?limit=500)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Add trusted host middleware for production
 if IS_PRODUCTION:
     ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',')
@@ -139,28 +189,26 @@ async def add_security_headers(request: Request, call_next):
 # ==========================================
 # RATE LIMITING (Simple in-memory)
 # ==========================================
-_rate_limit_store = {}
+_rate_limit_store: Dict[str, deque] = defaultdict(deque)
 RATE_LIMIT_REQUESTS = int(os.getenv('RATE_LIMIT_REQUESTS', '100'))
 RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', '60'))  # seconds
 
 def check_rate_limit(client_ip: str) -> bool:
-    """Simple rate limiting check"""
-    now = time.time()
+    """Simple rate limiting check (sliding window, amortized O(1))"""
+    now = time.monotonic()
+    timestamps = _rate_limit_store[client_ip]
     
-    # Clean old entries
-    _rate_limit_store[client_ip] = [
-        timestamp for timestamp in _rate_limit_store.get(client_ip, [])
-        if now - timestamp < RATE_LIMIT_WINDOW
-    ]
+    # Drop timestamps that left the window (oldest are on the left)
+    cutoff = now - RATE_LIMIT_WINDOW
+    while timestamps and timestamps[0] <= cutoff:
+        timestamps.popleft()
     
     # Check limit
-    if len(_rate_limit_store.get(client_ip, [])) >= RATE_LIMIT_REQUESTS:
+    if len(timestamps) >= RATE_LIMIT_REQUESTS:
         return False
     
     # Add current request
-    if client_ip not in _rate_limit_store:
-        _rate_limit_store[client_ip] = []
-    _rate_limit_store[client_ip].append(now)
+    timestamps.append(now)
     
     return True
 
@@ -210,27 +258,251 @@ def validate_positive_integer(value: int, name: str, max_value: int = 1000) -> i
 # ==========================================
 _cache = {}
 _cache_timeout = 60  # Cache 60 seconds
+_cache_stale_timeout = 600  # Serve expired data (while refreshing) for up to 10 minutes
 
-def get_cached_data():
-    """Get data from cache or fetch new from Google Sheets"""
-    now = time.time()
-    
-    # Check if cache exists and is still valid
+_cache_lock = asyncio.Lock()
+_refresh_task = None
+
+# Between full fetches only appended rows are read; a periodic full fetch
+# picks up manual edits to older rows
+FULL_REFETCH_SECONDS = 600
+
+# Last fetch is kept on disk so a restart doesn't start with a cold cache
+CACHE_FILE = os.getenv('DASHBOARD_CACHE_FILE') or os.path.join(os.path.dirname(__file__), '.sheet_cache.json')
+
+def save_cache_to_disk(data: List[Dict], timestamp: float, revision):
+    """Write fetched records to CACHE_FILE (atomically, owner-readable only)"""
+    tmp_path = f"{CACHE_FILE}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': timestamp, 'revision': revision, 'records': data}, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Could not write cache file: {type(e).__name__}")
+
+def load_cache_from_disk():
+    """Seed the in-memory cache from CACHE_FILE; freshness is checked as usual"""
+    try:
+        with open(CACHE_FILE, encoding='utf-8') as f:
+            saved = json.load(f)
+        data = saved['records']
+        _cache['_columns'] = build_columns(data)
+        _cache['_data'] = data
+        _cache['_timestamp'] = saved['timestamp']
+        _cache['_fetched_at'] = saved['timestamp']
+        _cache['_revision'] = saved['revision']
+        logger.info(f"💾 Loaded {len(data)} cached records from disk")
+    except FileNotFoundError:
+        pass
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        logger.warning(f"⚠️ Ignoring unreadable cache file: {type(e).__name__}")
+
+def get_fresh_cached_data():
+    """Cached records if still within the timeout, else None"""
     if '_data' in _cache and '_timestamp' in _cache:
-        cache_age = now - _cache['_timestamp']
+        cache_age = time.time() - _cache['_timestamp']
         if cache_age < _cache_timeout:
             logger.debug(f"✅ Using cached data (age: {int(cache_age)}s)")
             return _cache['_data']
+    return None
+
+async def get_cached_data():
+    """Get data from cache or fetch new from Google Sheets"""
+    global _refresh_task
+    
+    data = get_fresh_cached_data()
+    if data is not None:
+        return data
+    
+    # Stale-while-revalidate: answer from the expired cache and refresh in the background
+    if '_data' in _cache and time.time() - _cache['_timestamp'] < _cache_stale_timeout:
+        if _refresh_task is None or _refresh_task.done():
+            _refresh_task = asyncio.create_task(refresh_cache_in_background())
+        return _cache['_data']
+    
+    return await refresh_cache()
+
+async def refresh_cache_in_background():
+    """Background refresh; failures are logged and the stale data kept"""
+    try:
+        await refresh_cache()
+    except Exception as e:
+        logger.warning(f"⚠️ Background cache refresh failed: {type(e).__name__}")
+
+async def refresh_cache():
+    """Refetch from Google Sheets (only one refresh runs at a time)"""
+    # Concurrent misses wait for the running refresh instead of
+    # each hitting Google Sheets
+    async with _cache_lock:
+        data = get_fresh_cached_data()
+        if data is not None:
+            return data
+        
+        now = time.time()
+        
+        # Cache expired: only refetch when the spreadsheet actually changed
+        revision = await asyncio.to_thread(get_sheet_revision)
+        if '_data' in _cache and revision and revision == _cache.get('_revision'):
+            logger.debug("✅ Spreadsheet unchanged, extending cached data")
+            _cache['_timestamp'] = now
+            return _cache['_data']
+        
+        # Blocking gspread calls run off the event loop
+        data = None
+        if '_data' in _cache and now - _cache.get('_full_fetch_at', 0) < FULL_REFETCH_SECONDS:
+            appended = await asyncio.to_thread(get_appended_records, _cache['_data'])
+            if appended is not None:
+                logger.info(f"🔄 Fetched {len(appended)} new rows from Google Sheets")
+                data = _cache['_data'] + appended
+        
+        if data is None:
+            logger.info("🔄 Fetching fresh data from Google Sheets...")
+            data = await asyncio.to_thread(get_sheet_data)
+            _cache['_full_fetch_at'] = now
+        
+        # Update cache (records are parsed once here, not on every request)
+        _cache['_data'] = data
+        _cache['_columns'] = build_columns(data)
+        _cache['_timestamp'] = now
+        _cache['_fetched_at'] = now  # unlike _timestamp, not bumped when the sheet is unchanged
+        _cache['_revision'] = revision
+        
+        await asyncio.to_thread(save_cache_to_disk, data, now, revision)
+        
+        return data
+
+async def get_cached_columns() -> 'SheetColumns':
+    """Get the parsed column bundle for the cached records"""
+    await get_cached_data()
+    return _cache['_columns']
+
+def memoize_per_data(endpoint):
+    """Reuse an endpoint's result (per query params) until the cached data changes or the day rolls over"""
+    @wraps(endpoint)
+    async def wrapper(**kwargs):
+        columns = await get_cached_columns()
+        
+        results = _cache.setdefault('_results', {})
+        if results.get('_source') is not columns:
+            results.clear()
+            results['_source'] = columns
+        
+        key = (endpoint.__name__, tuple(sorted(kwargs.items())), datetime.now(tz=WIB).date())
+        if key not in results:
+            results[key] = await endpoint(**kwargs)
+        return results[key]
+    
+    return wrapper
+
+def get_sheet_revision():
+    """Get the spreadsheet's Drive modifiedTime (cheap metadata call), or None"""
+    client = getattr(app.state, 'gs_client', None)
+    if client is None:
+        return None
+    
+    try:
+        response = client.request(
+            'get',
+            f"{DRIVE_FILES_API_V3_URL}/{SPREADSHEET_ID}",
+            params={'fields': 'modifiedTime', 'supportsAllDrives': True}
+        )
+        return response.json().get('modifiedTime')
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read spreadsheet revision: {type(e).__name__}")
+        return None
+
+SHEETS_SCOPES = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/drive'
+]
+
+def connect_sheet():
+    """Authorize once and keep the client + worksheet handle in app.state"""
+    # google-auth refreshes the access token itself shortly before it expires
+    creds = Credentials.from_service_account_file(
+        CREDENTIALS_FILE, 
+        scopes=SHEETS_SCOPES
+    )
+    
+    client = gspread.authorize(creds)
+    app.state.gs_client = client
+    app.state.ws = client.open_by_key(SPREADSHEET_ID).sheet1
+    
+    logger.info("✅ Connected to Google Sheets")
+    return app.state.ws
+
+@app.on_event("startup")
+def startup_connect_sheet():
+    """Connect to Google Sheets when the API starts"""
+    load_cache_from_disk()
+    try:
+        connect_sheet()
+    except Exception as e:
+        # Retried lazily on the first request
+        logger.error(f"❌ Could not connect to Google Sheets at startup: {type(e).__name__}")
+
+# Tanggal .. Keterangan + Detail; the balance column isn't used by the dashboard
+SHEET_DATA_RANGE = 'A:G'
+# Day zero for Sheets date serial numbers
+SHEETS_EPOCH = date(1899, 12, 30)
+
+def rows_to_records(values: List[List]) -> List[Dict]:
+    """Zip the header row with each data row (like get_all_records, without re-parsing)"""
+    if not values:
+        return []
+    
+    header, rows = values[0], values[1:]
+    records = []
+    
+    for row in rows:
+        record = dict(zip(header, row))
+        
+        # Dates typed in the Sheets UI come back as serial numbers
+        tanggal = record.get('Tanggal')
+        if isinstance(tanggal, (int, float)):
+            record['Tanggal'] = (SHEETS_EPOCH + timedelta(days=int(tanggal))).strftime('%d/%m/%Y')
+        
+        records.append(record)
+    
+    return records
+
+def fetch_sheet_values(range_name: str) -> List[List]:
+    """Raw (unformatted) cell values for range_name, re-authorizing once on 401"""
+    sheet = getattr(app.state, 'ws', None) or connect_sheet()
     
-    # Fetch fresh data
-    logger.info("🔄 Fetching fresh data from Google Sheets...")
-    data = get_sheet_data()
+    try:
+        return sheet.get_values(range_name, value_render_option='UNFORMATTED_VALUE')
+    except gspread.exceptions.APIError as e:
+        if e.response.status_code != 401:
+            raise
+        # Token rejected: re-authorize once and retry
+        logger.warning("🔑 Google Sheets returned 401, re-authorizing...")
+        return connect_sheet().get_values(range_name, value_render_option='UNFORMATTED_VALUE')
+
+def get_appended_records(cached: List[Dict]) -> Optional[List[Dict]]:
+    """
+    Fetch only the rows added after the cached ones (the bot only appends).
+    Returns None when a full refetch is needed instead.
+    """
+    if not cached:
+        return None
+    
+    try:
+        header = list(cached[0].keys())
+        # Start at the last cached row (row 1 is the header) so it can be compared
+        values = fetch_sheet_values(f"A{len(cached) + 1}:G")
+        rows = [row + [''] * (len(header) - len(row)) for row in values if row]
+        records = rows_to_records([header] + rows)
+    except Exception as e:
+        logger.warning(f"⚠️ Incremental fetch failed, doing a full fetch: {type(e).__name__}")
+        return None
     
-    # Update cache
-    _cache['_data'] = data
-    _cache['_timestamp'] = now
+    # Overlap row changed: rows were edited or deleted, positions can't be trusted
+    if not records or records[0] != cached[-1]:
+        return None
     
-    return data
+    return records[1:]
 
 def get_sheet_data():
     """Get data from Google Sheets"""
@@ -240,22 +512,7 @@ def get_sheet_data():
             logger.debug(f"📂 Credentials file: {CREDENTIALS_FILE}")
             logger.debug(f"📊 Spreadsheet ID: {SPREADSHEET_ID}")
         
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            CREDENTIALS_FILE, 
-            scope
-        )
-        
-        client = gspread.authorize(creds)
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = spreadsheet.sheet1
-        
-        # Get all records
-        records = sheet.get_all_records()
+        records = rows_to_records(fetch_sheet_values(SHEET_DATA_RANGE))
         
         logger.info(f"✅ Fetched {len(records)} records from Google Sheets")
         return records
@@ -280,39 +537,152 @@ def get_sheet_data():
         )
 
 
-def parse_date_ddmmyyyy(value: str) -> date:
-    day, month, year = map(int, value.split('/'))
-    return date(year, month, day)
+DATE_DDMMYYYY_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+def parse_date_ddmmyyyy(value: str) -> Optional[date]:
+    """Parse DD/MM/YYYY, None if the text doesn't look like a date (invalid days still raise ValueError)"""
+    match = DATE_DDMMYYYY_RE.fullmatch(value.strip())
+    if not match:
+        return None
+    day, month, year = match.groups()
+    return date(int(year), int(month), int(day))
 
 
-def filter_records_by_range(records: List[Dict], start: date, end: date) -> List[Dict]:
-    filtered = []
+@dataclass
+class SheetColumns:
+    """Dated records parsed once and stored column-wise, sorted by date (same index = same row)
+
+    Numeric columns are typed arrays (8 bytes per value instead of a float object each)
+    """
+    records: List[Dict] = field(default_factory=list)
+    dates: List[date] = field(default_factory=list)
+    amounts: array = field(default_factory=lambda: array('d'))
+    tipe: List[str] = field(default_factory=list)
+    # Per-type amounts (0.0 for rows of the other type) so totals are a plain sum()
+    pemasukan: array = field(default_factory=lambda: array('d'))
+    pengeluaran: array = field(default_factory=lambda: array('d'))
+    kategori_codes: array = field(default_factory=lambda: array('I'))  # index into kategori_vocab
+    kategori_vocab: List[str] = field(default_factory=list)
+    pdf_rows: List[tuple] = field(default_factory=list)  # ready-to-draw PDF table cells
+
+
+def format_amount_text(amount: float) -> str:
+    return f"{'-' if amount < 0 else '+'} Rp {abs(amount):,.0f}"
+
+
+def pdf_row_cells(record: Dict, amount: float) -> tuple:
+    """PDF table cells for one record (Tanggal/Waktu, Kategori, Keterangan, Jumlah), truncated to fit"""
+    tanggal = str(record.get('Tanggal', ''))
+    waktu = record.get('Waktu', '')
+    return (
+        f"{tanggal}\n{waktu}" if waktu else tanggal,
+        str(record.get('Kategori', ''))[:14],
+        str(record.get('Keterangan', ''))[:50],
+        format_amount_text(amount)
+    )
+
+
+def build_columns(records: List[Dict]) -> SheetColumns:
+    """Parse Tanggal/Jumlah once per fetch; rows without a valid date are skipped"""
+    parsed = []
+    dates_by_text = {}  # many rows share a day, parse each distinct string once
     for record in records:
         date_str = record.get('Tanggal', '')
         if not date_str:
             continue
-        try:
-            d = parse_date_ddmmyyyy(date_str)
-            if start <= d <= end:
-                filtered.append(record)
-        except:
+        if date_str not in dates_by_text:
+            try:
+                dates_by_text[date_str] = parse_date_ddmmyyyy(str(date_str))
+            except ValueError:
+                dates_by_text[date_str] = None
+        d = dates_by_text[date_str]
+        if d is None:
             continue
-    return filtered
+        try:
+            amount = float(record.get('Jumlah', 0))
+        except (ValueError, TypeError):
+            amount = 0.0
+        parsed.append((d, record, amount))
+    
+    # Sorted once here so range queries are two binary searches (stable: same-day rows keep sheet order)
+    parsed.sort(key=lambda row: row[0])
+    
+    columns = SheetColumns()
+    kategori_index = {}
+    tipe_values = {}  # one shared string object per distinct Tipe
+    for d, record, amount in parsed:
+        kategori = record.get('Kategori', 'Lainnya')
+        if kategori not in kategori_index:
+            kategori_index[kategori] = len(columns.kategori_vocab)
+            columns.kategori_vocab.append(kategori)
+        
+        tipe = record.get('Tipe', '')
+        tipe = tipe_values.setdefault(tipe, tipe)
+        
+        columns.records.append(record)
+        columns.dates.append(d)
+        columns.amounts.append(amount)
+        columns.tipe.append(tipe)
+        columns.pemasukan.append(amount if tipe == 'Pemasukan' else 0.0)
+        columns.pengeluaran.append(abs(amount) if tipe == 'Pengeluaran' else 0.0)
+        columns.kategori_codes.append(kategori_index[kategori])
+        columns.pdf_rows.append(pdf_row_cells(record, amount))
+    return columns
+
+
+def filter_records_by_range(columns: SheetColumns, start: date, end: date) -> SheetColumns:
+    """Rows dated between start and end (inclusive), via binary search on the sorted dates"""
+    lo = bisect_left(columns.dates, start)
+    hi = bisect_right(columns.dates, end)
+    return SheetColumns(
+        records=columns.records[lo:hi],
+        dates=columns.dates[lo:hi],
+        amounts=columns.amounts[lo:hi],
+        tipe=columns.tipe[lo:hi],
+        pemasukan=columns.pemasukan[lo:hi],
+        pengeluaran=columns.pengeluaran[lo:hi],
+        kategori_codes=columns.kategori_codes[lo:hi],
+        kategori_vocab=columns.kategori_vocab,
+        pdf_rows=columns.pdf_rows[lo:hi]
+    )
+
+
+def month_bounds(day: date):
+    """First and last date of the month containing day"""
+    month_start = day.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start, next_month - timedelta(days=1)
+
+
+def current_month_columns(columns: SheetColumns) -> SheetColumns:
+    """Current-month rows, sliced once per cache refresh and shared by summary and categories"""
+    today = datetime.now(tz=WIB).date()
+    month_key = (today.year, today.month)
+    
+    if _cache.get('_month_source') is not columns or _cache.get('_month_key') != month_key:
+        _cache['_month_columns'] = filter_records_by_range(columns, *month_bounds(today))
+        _cache['_month_source'] = columns
+        _cache['_month_key'] = month_key
+    
+    return _cache['_month_columns']
+
+
+def daily_spending(columns: SheetColumns) -> Dict[date, float]:
+    """Total pengeluaran per day, grouped once per cache refresh"""
+    if _cache.get('_daily_source') is not columns:
+        totals = {}
+        for d, spent in zip(columns.dates, columns.pengeluaran):
+            if spent:
+                totals[d] = totals.get(d, 0) + spent
+        _cache['_daily_spending'] = totals
+        _cache['_daily_source'] = columns
+    
+    return _cache['_daily_spending']
 
 
-def compute_totals(records: List[Dict]) -> Dict:
-    pemasukan = 0.0
-    pengeluaran = 0.0
-    for r in records:
-        tipe = r.get('Tipe', '')
-        try:
-            amount = float(r.get('Jumlah', 0))
-        except:
-            amount = 0
-        if tipe == 'Pemasukan':
-            pemasukan += amount
-        elif tipe == 'Pengeluaran':
-            pengeluaran += abs(amount)
+def compute_totals(columns: SheetColumns) -> Dict:
+    pemasukan = sum(columns.pemasukan, 0.0)
+    pengeluaran = sum(columns.pengeluaran, 0.0)
     return {
         "pemasukan": pemasukan,
         "pengeluaran": pengeluaran,
@@ -320,7 +690,7 @@ def compute_totals(records: List[Dict]) -> Dict:
     }
 
 
-def build_pdf(records: List[Dict], period_label: str) -> BytesIO:
+def build_pdf(columns: SheetColumns, period_label: str) -> bytes:
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font('Helvetica', 'B', 14)
@@ -331,7 +701,7 @@ def build_pdf(records: List[Dict], period_label: str) -> BytesIO:
     pdf.cell(0, 8, f'Digenerate: {generated_at}', ln=1)
     pdf.ln(2)
 
-    totals = compute_totals(records)
+    totals = compute_totals(columns)
     pdf.set_font('Helvetica', 'B', 11)
     pdf.cell(0, 8, 'Ringkasan', ln=1)
     pdf.set_font('Helvetica', '', 11)
@@ -340,42 +710,45 @@ def build_pdf(records: List[Dict], period_label: str) -> BytesIO:
     pdf.cell(0, 7, f'Selisih          : Rp {totals["net"]:,.0f}', ln=1)
     pdf.ln(4)
 
-    # Table header
-    pdf.set_font('Helvetica', 'B', 10)
-    pdf.cell(30, 8, 'Tanggal', border=1)
-    pdf.cell(25, 8, 'Kategori', border=1)
-    pdf.cell(85, 8, 'Keterangan', border=1)
-    pdf.cell(40, 8, 'Jumlah', border=1, ln=1)
-
+    # Row texts were formatted when the cache was built; lay them out as one table
     pdf.set_font('Helvetica', '', 10)
-    for r in records:
-        tanggal = r.get('Tanggal', '')
-        waktu = r.get('Waktu', '')
-        kategori = r.get('Kategori', '')
-        ket = r.get('Keterangan', '')
-        try:
-            amt = float(r.get('Jumlah', 0))
-        except:
-            amt = 0
-        amount_text = f"{'-' if amt < 0 else '+'} Rp {abs(amt):,.0f}"
-
-        # Cells
-        pdf.cell(30, 8, f"{tanggal}\n{waktu}" if waktu else tanggal, border=1)
-        pdf.cell(25, 8, kategori[:14], border=1)
-        pdf.cell(85, 8, ket[:50], border=1)
-        pdf.cell(40, 8, amount_text, border=1, ln=1)
-
-    if not records:
+    with pdf.table(width=180, col_widths=(30, 25, 85, 40), text_align='LEFT') as table:
+        table.row(('Tanggal', 'Kategori', 'Keterangan', 'Jumlah'))
+        for row in columns.pdf_rows:
+            table.row(row)
+
+    if not columns.records:
         pdf.cell(0, 8, 'Tidak ada data untuk periode ini.', ln=1)
 
-    buffer = BytesIO()
-    pdf.output(buffer)
-    buffer.seek(0)
-    return buffer
+    # fpdf2 returns the document as a bytearray; no intermediate buffer copy
+    return bytes(pdf.output())
+
+
+# Recent PDF renders, keyed by period and data version (oldest evicted first)
+_pdf_jobs: Dict[tuple, asyncio.Task] = {}
+PDF_JOBS_MAX = 8
+
+async def render_pdf(columns: SheetColumns, period_label: str) -> bytes:
+    """Render in a worker thread; identical exports of the same cached data share one render"""
+    key = (period_label, _cache.get('_fetched_at'))
+    task = _pdf_jobs.get(key)
+    
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(build_pdf, columns, period_label))
+        _pdf_jobs[key] = task
+        while len(_pdf_jobs) > PDF_JOBS_MAX:
+            del _pdf_jobs[next(iter(_pdf_jobs))]
+    
+    try:
+        # Shielded so one client disconnecting doesn't cancel a shared render
+        return await asyncio.shield(task)
+    except Exception:
+        _pdf_jobs.pop(key, None)
+        raise
 
 
 @app.get("/")
-def root():
+async def root():
     """Root endpoint - redirects to dashboard"""
     return {
         "message": "Finance Dashboard API",
@@ -392,40 +765,18 @@ def root():
 
 
 @app.get("/api/summary")
-def get_summary():
+@memoize_per_data
+async def get_summary():
     """Get summary statistics for current month"""
     try:
-        records = get_cached_data()  # Use cache for better performance
+        columns = await get_cached_columns()  # Use cache for better performance
         
-        # Get current month
+        # Current month only
         now = datetime.now(tz=WIB)
-        current_month = now.month
-        current_year = now.year
-        
-        pemasukan = 0
-        pengeluaran = 0
-        
-        for record in records:
-            # Parse date (format: DD/MM/YYYY)
-            date_str = record.get('Tanggal', '')
-            if not date_str:
-                continue
-                
-            try:
-                day, month, year = map(int, date_str.split('/'))
-                trans_date = datetime(year, month, day)
-                
-                # Filter current month
-                if trans_date.month == current_month and trans_date.year == current_year:
-                    tipe = record.get('Tipe', '')
-                    jumlah = float(record.get('Jumlah', 0))
-                    
-                    if tipe == 'Pemasukan':
-                        pemasukan += jumlah
-                    elif tipe == 'Pengeluaran':
-                        pengeluaran += abs(jumlah)
-            except (ValueError, TypeError):
-                continue
+        totals = compute_totals(current_month_columns(columns))
+        
+        pemasukan = totals["pemasukan"]
+        pengeluaran = totals["pengeluaran"]
         
         saving = pemasukan - pengeluaran
         saving_percent = (saving / pemasukan * 100) if pemasukan > 0 else 0
@@ -446,33 +797,29 @@ def get_summary():
 
 
 @app.get("/api/transactions")
-def get_transactions(limit: int = 50):
+@memoize_per_data
+async def get_transactions(limit: int = 50):
     """Get recent transactions"""
     try:
         # Validate input
         limit = validate_positive_integer(limit, "limit", max_value=500)
         
-        records = get_cached_data()  # Use cache
-        
-        # Sort by date (newest first) and limit
-        transactions = []
-        for record in records:
-            try:
-                transactions.append({
-                    "tanggal": str(record.get('Tanggal', ''))[:10],  # Limit length
-                    "waktu": str(record.get('Waktu', ''))[:8],
-                    "tipe": str(record.get('Tipe', ''))[:20],
-                    "kategori": str(record.get('Kategori', ''))[:50],
-                    "jumlah": float(record.get('Jumlah', 0)),
-                    "keterangan": str(record.get('Keterangan', ''))[:200],  # Limit
-                    "detail": str(record.get('Detail', ''))[:500]  # Limit
-                })
-            except (ValueError, TypeError) as e:
-                logger.error(f"Error parsing record: {e}")
-                continue
-        
-        # Reverse to get newest first
-        transactions = transactions[-limit:][::-1]
+        columns = await get_cached_columns()  # Use cache
+        
+        # Columns are already sorted by date: build dicts for the newest `limit` rows only
+        newest = range(len(columns.records) - 1, max(len(columns.records) - limit, 0) - 1, -1)
+        transactions = [
+            {
+                "tanggal": str(columns.records[i].get('Tanggal', ''))[:10],  # Limit length
+                "waktu": str(columns.records[i].get('Waktu', ''))[:8],
+                "tipe": str(columns.tipe[i])[:20],
+                "kategori": str(columns.records[i].get('Kategori', ''))[:50],
+                "jumlah": columns.amounts[i],
+                "keterangan": str(columns.records[i].get('Keterangan', ''))[:200],  # Limit
+                "detail": str(columns.records[i].get('Detail', ''))[:500]  # Limit
+            }
+            for i in newest
+        ]
         
         return {
             "transactions": transactions,
@@ -487,39 +834,23 @@ def get_transactions(limit: int = 50):
 
 
 @app.get("/api/trends")
-def get_trends(days: int = 7):
+@memoize_per_data
+async def get_trends(days: int = 7):
     """Get spending trends for last N days"""
     try:
         # Validate input
         days = validate_positive_integer(days, "days", max_value=365)
         
-        records = get_cached_data()
+        columns = await get_cached_columns()
         
-        # Calculate daily expenses for last N days
-        daily_data = {}
+        # Daily expenses for last N days, oldest first (days without spending are 0)
+        spending = daily_spending(columns)
+        today = datetime.now(tz=WIB).date()
         
-        for i in range(days):
-            date = datetime.now(tz=WIB) - timedelta(days=i)
-            date_str = date.strftime('%d/%m/%Y')
-            daily_data[date_str] = {
-                "date": date.strftime('%d %b'),
-                "amount": 0
-            }
-        
-        for record in records:
-            date_str = record.get('Tanggal', '')
-            if date_str in daily_data:
-                tipe = record.get('Tipe', '')
-                if tipe == 'Pengeluaran':
-                    try:
-                        jumlah = abs(float(record.get('Jumlah', 0)))
-                        daily_data[date_str]["amount"] += jumlah
-                    except (ValueError, TypeError):
-                        continue
-        
-        # Convert to list and sort by date
-        trends = list(daily_data.values())
-        trends.reverse()
+        trends = []
+        for i in range(days - 1, -1, -1):
+            day = today - timedelta(days=i)
+            trends.append({"date": day.strftime('%d %b'), "amount": spending.get(day, 0)})
         
         return {
             "trends": trends,
@@ -534,48 +865,25 @@ def get_trends(days: int = 7):
 
 
 @app.get("/api/categories")
-def get_categories():
+@memoize_per_data
+async def get_categories():
     """Get spending breakdown by category (current month)"""
     try:
-        records = get_sheet_data()
-        
-        # Get current month
-        now = datetime.now(tz=WIB)
-        current_month = now.month
-        current_year = now.year
+        # Current month only (same slice as the summary)
+        month = current_month_columns(await get_cached_columns())
         
-        categories = {}
+        # Per-category totals indexed by kategori code (no dict hashing per row);
+        # the pengeluaran column is 0.0 for income rows
+        totals = [0] * len(month.kategori_vocab)
         
-        for record in records:
-            # Parse date
-            date_str = record.get('Tanggal', '')
-            if not date_str:
-                continue
-                
-            try:
-                day, month, year = map(int, date_str.split('/'))
-                trans_date = datetime(year, month, day)
-                
-                # Filter current month and pengeluaran only
-                if (trans_date.month == current_month and 
-                    trans_date.year == current_year and 
-                    record.get('Tipe') == 'Pengeluaran'):
-                    
-                    kategori = record.get('Kategori', 'Lainnya')
-                    jumlah = abs(float(record.get('Jumlah', 0)))
-                    
-                    if kategori not in categories:
-                        categories[kategori] = 0
-                    
-                    categories[kategori] += jumlah
-                    
-            except:
-                continue
+        for spent, code in zip(month.pengeluaran, month.kategori_codes):
+            if spent:
+                totals[code] += spent
         
         # Convert to list format for frontend
         category_list = [
-            {"name": k, "value": v} 
-            for k, v in categories.items()
+            {"name": month.kategori_vocab[code], "value": total} 
+            for code, total in enumerate(totals) if total
         ]
         
         # Sort by value descending
@@ -593,43 +901,32 @@ def get_categories():
 
 
 @app.get("/api/monthly-comparison")
-def get_monthly_comparison(months: int = 3):
+@memoize_per_data
+async def get_monthly_comparison(months: int = 3):
     """Get monthly income vs expense comparison"""
     try:
-        records = get_sheet_data()
+        # Validate input
+        months = validate_positive_integer(months, "months", max_value=120)
         
-        monthly_data = {}
+        columns = await get_cached_columns()
         
-        for record in records:
-            date_str = record.get('Tanggal', '')
-            if not date_str:
-                continue
-                
-            try:
-                day, month, year = map(int, date_str.split('/'))
-                month_key = f"{year}-{month:02d}"
-                month_name = datetime(year, month, 1).strftime('%b %Y')
-                
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {
-                        "month": month_name,
-                        "pemasukan": 0,
-                        "pengeluaran": 0
-                    }
-                
-                tipe = record.get('Tipe', '')
-                jumlah = float(record.get('Jumlah', 0))
-                
-                if tipe == 'Pemasukan':
-                    monthly_data[month_key]["pemasukan"] += jumlah
-                elif tipe == 'Pengeluaran':
-                    monthly_data[month_key]["pengeluaran"] += abs(jumlah)
-                    
-            except:
-                continue
-        
-        # Get last N months
-        comparison = list(monthly_data.values())[-months:]
+        # Dates are sorted: step back one month at a time from the newest row,
+        # bisecting to each month's first row and summing the per-type columns
+        comparison = []
+        hi = len(columns.dates)
+        
+        while hi and len(comparison) < months:
+            newest = columns.dates[hi - 1]
+            lo = bisect_left(columns.dates, newest.replace(day=1), 0, hi)
+            comparison.append({
+                "month": newest.strftime('%b %Y'),
+                "pemasukan": sum(columns.pemasukan[lo:hi]),
+                "pengeluaran": sum(columns.pengeluaran[lo:hi])
+            })
+            hi = lo
+        
+        # Oldest month first
+        comparison.reverse()
         
         return {
             "comparison": comparison,
@@ -643,22 +940,22 @@ def get_monthly_comparison(months: int = 3):
 
 
 @app.get("/api/export/pdf")
-def export_pdf(preset: str = 'this_month', start: str = None, end: str = None):
+async def export_pdf(preset: str = 'this_month', start: str = None, end: str = None):
     """Export transaksi ke PDF berdasarkan preset atau rentang tanggal"""
     try:
-        records = get_sheet_data()
+        columns = await get_cached_columns()
 
-        today = date.today()
+        today = datetime.now(tz=WIB).date()
         period_label = ''
 
         if preset == 'all':
-            filtered = records
+            filtered = columns
             period_label = 'Semua data'
         elif preset == 'last_month':
             first_day = date(today.year, today.month, 1) - timedelta(days=1)
             start_date = date(first_day.year, first_day.month, 1)
             end_date = date(first_day.year, first_day.month, first_day.day)
-            filtered = filter_records_by_range(records, start_date, end_date)
+            filtered = filter_records_by_range(columns, start_date, end_date)
             period_label = f"{start_date.strftime('%B %Y')}"
         elif preset == 'custom':
             if not start or not end:
@@ -667,23 +964,19 @@ def export_pdf(preset: str = 'this_month', start: str = None, end: str = None):
             end_date = datetime.strptime(end, '%Y-%m-%d').date()
             if start_date > end_date:
                 raise HTTPException(status_code=400, detail="start tidak boleh lebih besar dari end")
-            filtered = filter_records_by_range(records, start_date, end_date)
+            filtered = filter_records_by_range(columns, start_date, end_date)
             period_label = f"{start_date.strftime('%d/%m/%Y')} - {end_date.strftime('%d/%m/%Y')}"
         else:  # this_month default
-            start_date = date(today.year, today.month, 1)
-            if today.month == 12:
-                end_date = date(today.year, 12, 31)
-            else:
-                end_date = date(today.year, today.month + 1, 1) - timedelta(days=1)
-            filtered = filter_records_by_range(records, start_date, end_date)
+            start_date, end_date = month_bounds(today)
+            filtered = filter_records_by_range(columns, start_date, end_date)
             period_label = f"{today.strftime('%B %Y')}"
 
-        pdf_buffer = build_pdf(filtered, period_label)
+        pdf_bytes = await render_pdf(filtered, period_label)
 
         headers = {
             "Content-Disposition": "attachment; filename=transaksi.pdf"
         }
-        return StreamingResponse(pdf_buffer, media_type="application/pdf", headers=headers)
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
     except HTTPException:
         raise
@@ -694,11 +987,12 @@ def export_pdf(preset: str = 'this_month', start: str = None, end: str = None):
 
 # Health check
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now(tz=WIB).isoformat()}
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # loop/http "auto" pick uvloop + httptools when installed (uvicorn[standard])
+    uvicorn.run(app, host="0.0.0.0", port=8001, loop="auto", http="auto")
\ No newline at end of file
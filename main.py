@@ -1,9 +1,20 @@
 """Entry point Bot Keuangan (jalankan dengan: python main.py)."""
+import asyncio
 import logging
+from urllib.parse import urlparse
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
+from telegram.request import HTTPXRequest
 from config.settings import Config
-from config.constants import LOG_FORMAT, LOG_LEVEL
+from config.constants import (
+    LOG_FORMAT,
+    LOG_LEVEL,
+    TELEGRAM_CONNECTION_POOL_SIZE,
+    TELEGRAM_CONNECT_TIMEOUT_SECONDS,
+    TELEGRAM_READ_TIMEOUT_SECONDS,
+    TELEGRAM_WRITE_TIMEOUT_SECONDS,
+    TELEGRAM_POOL_TIMEOUT_SECONDS
+)
 from bot.handlers import (
     start_command,
     help_command,
@@ -12,6 +23,7 @@ from bot.handlers import (
     handle_text_message,
     error_handler
 )
+from bot.writer import start_sheets_worker, stop_sheets_worker
 
 logging.basicConfig(
     format=LOG_FORMAT,
@@ -19,13 +31,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Pakai uvloop kalau tersedia (tidak ada di Windows), fallback ke asyncio biasa
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
 def main():
     """Fungsi utama untuk menjalankan bot"""
     
     logger.info("🚀 Memulai Bot Keuangan...")
+    logger.info(f"🔁 Event loop: {'uvloop' if uvloop else 'asyncio'}")
     logger.info(f"📱 Token: {Config.TELEGRAM_TOKEN[:10] if Config.TELEGRAM_TOKEN else 'NOT SET'}...")
     
-    app = Application.builder().token(Config.TELEGRAM_TOKEN).build()
+    # Batasi pool koneksi & timeout supaya request macet gagal cepat
+    request = HTTPXRequest(
+        connection_pool_size=TELEGRAM_CONNECTION_POOL_SIZE,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=TELEGRAM_READ_TIMEOUT_SECONDS,
+        write_timeout=TELEGRAM_WRITE_TIMEOUT_SECONDS,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT_SECONDS
+    )
+    
+    app = (
+        Application.builder()
+        .token(Config.TELEGRAM_TOKEN)
+        .request(request)
+        .post_init(start_sheets_worker)
+        .post_shutdown(stop_sheets_worker)
+        .build()
+    )
     
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
@@ -43,7 +79,19 @@ def main():
     logger.info("💬 Kirim pesan ke bot kamu di Telegram untuk test")
     logger.info("⚠️  Tekan Ctrl+C untuk stop bot")
     
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if Config.TELEGRAM_WEBHOOK_URL:
+        # Webhook: Telegram push update ke server kita, tanpa long-poll
+        logger.info(f"🌐 Mode webhook di port {Config.TELEGRAM_WEBHOOK_PORT}")
+        app.run_webhook(
+            listen=Config.TELEGRAM_WEBHOOK_LISTEN,
+            port=Config.TELEGRAM_WEBHOOK_PORT,
+            url_path=urlparse(Config.TELEGRAM_WEBHOOK_URL).path.lstrip('/'),
+            webhook_url=Config.TELEGRAM_WEBHOOK_URL,
+            secret_token=Config.TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
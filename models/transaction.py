@@ -1,17 +1,22 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 
 @dataclass
 class Transaction:
     """Model untuk menyimpan data transaksi"""
-    amount: float
+    amount: int  # rupiah utuh
     transaction_type: str  # 'income' atau 'expense'
     category: str
     description: str
     date: datetime
     photo_url: Optional[str] = None
     detail: Optional[str] = None  # Detail items dari struk
+    balance: Optional[float] = None  # Saldo setelah transaksi (diisi saat dicatat)
+    signed_amount: int = field(init=False, repr=False)  # + pemasukan, - pengeluaran
+    
+    def __post_init__(self):
+        self.signed_amount = self.amount if self.transaction_type == 'income' else -self.amount
     
     def to_dict(self):
         """Ubah menjadi dict untuk penyimpanan."""
@@ -26,6 +31,19 @@ class Transaction:
             'photo_url': self.photo_url or ''
         }
     
+    def to_row(self) -> list:
+        """Ubah menjadi satu baris sheet (jumlah bertanda, saldo di kolom terakhir)."""
+        return [
+            self.date.strftime('%d/%m/%Y'),
+            self.date.strftime('%H:%M:%S'),
+            'Pemasukan' if self.transaction_type == 'income' else 'Pengeluaran',
+            self.category,
+            self.signed_amount,
+            self.description,
+            self.detail or '',
+            self.balance
+        ]
+    
     def format_message(self):
         """Format pesan konfirmasi ke pengguna."""
         emoji = '💰' if self.transaction_type == 'income' else '💸'
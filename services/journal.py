@@ -0,0 +1,69 @@
+"""Jurnal lokal (SQLite) untuk transaksi yang belum tertulis ke Google Sheets.
+
+Transaksi dicatat di sini begitu diterima, lalu dihapus setelah append_rows
+berhasil. Kalau bot mati atau Sheets gagal, sisa transaksi dikirim ulang saat
+bot start berikutnya, jadi antrian di memori tidak lagi jadi satu-satunya salinan.
+"""
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Tuple
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionJournal:
+    """Outbox transaksi di SQLite (mode WAL)."""
+
+    def __init__(self, path: str):
+        # Dipakai dari event loop dan thread worker, jadi akses dijaga lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pending_tx ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL)'
+        )
+        self._lock = threading.Lock()
+
+    def add(self, transaction: Transaction) -> int:
+        """Catat transaksi, kembalikan id jurnalnya."""
+        payload = json.dumps({
+            'amount': transaction.amount,
+            'transaction_type': transaction.transaction_type,
+            'category': transaction.category,
+            'description': transaction.description,
+            'date': transaction.date.isoformat(),
+            'detail': transaction.detail,
+            'balance': transaction.balance,
+        })
+        with self._lock:
+            return self._conn.execute('INSERT INTO pending_tx (payload) VALUES (?)', (payload,)).lastrowid
+
+    def pending(self) -> List[Tuple[int, Transaction]]:
+        """Semua transaksi yang belum tertulis ke Sheets, urut waktu dicatat."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, payload FROM pending_tx ORDER BY id').fetchall()
+
+        result = []
+        for journal_id, payload in rows:
+            data = json.loads(payload)
+            data['date'] = datetime.fromisoformat(data['date'])
+            result.append((journal_id, Transaction(**data)))
+        return result
+
+    def mark_synced(self, journal_ids: List[int]):
+        """Hapus transaksi yang sudah tertulis ke Sheets."""
+        if not journal_ids:
+            return
+        placeholders = ','.join('?' * len(journal_ids))
+        with self._lock:
+            self._conn.execute(f'DELETE FROM pending_tx WHERE id IN ({placeholders})', journal_ids)
+    
+    def close(self):
+        """Tutup koneksi SQLite (dipanggil saat worker berhenti)."""
+        with self._lock:
+            self._conn.close()
@@ -1,19 +1,131 @@
 import re
 import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
 from google.cloud import vision
-from typing import Optional, Dict
-from datetime import datetime, timezone, timedelta
+from typing import Optional, Dict, List
+from datetime import datetime
+from config.constants import WIB, VISION_BATCH_SIZE, OCR_CACHE_SIZE
+from services.parser import to_ascii_digits
+
+logger = logging.getLogger(__name__)
+
+# Pattern nominal di struk, satu alternasi supaya teks cukup dipindai sekali.
+# Nama grup menandai jenis nominal yang cocok; re.ASCII: \d cukup 0-9
+# (digit lain dinormalisasi dulu lewat to_ascii_digits)
+_AMOUNT_RE = re.compile(
+    # Total dengan label (prioritas tertinggi)
+    r'(?:^|\n)total[\s:]*(?:rp)?[\s.,]*(?P<total>\d+[\d.,]*)'
+    r'|(?:grand\s*total|jumlah|bayar)[\s:]*(?:rp)?[\s.,]*(?P<label>\d+[\d.,]*)'
+    # Rp dengan angka
+    r'|rp[\s.,]*(?P<rp>\d+[\d.,]*)'
+    # Angka dengan separator ribuan (titik atau koma)
+    r'|(?P<thou>\d{1,3}(?:[.,]\d{3})+)'
+    # Angka biasa di atas 1000
+    r'|(?P<big>\b\d{4,}\b)',
+    re.IGNORECASE | re.MULTILINE | re.ASCII
+)
+_AMOUNT_GROUP_PRIORITY = ('total', 'label', 'rp', 'thou', 'big')
+
+# Pattern untuk berbagai format tanggal
+_DATE_PATTERNS = [
+    # DD/MM/YYYY, DD-MM-YYYY
+    (re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', re.IGNORECASE), 'dmy'),
+    # DD/MM/YY, DD-MM-YY
+    (re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{2})\b', re.IGNORECASE), 'dmy2'),
+    # YYYY-MM-DD, YYYY/MM/DD
+    (re.compile(r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', re.IGNORECASE), 'ymd'),
+    # DD Mon YYYY (25 Dec 2024, 25 Des 2024, Oct 23 2023)
+    (re.compile(r'(\d{1,2})\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|des|agu|okt)\w*\s+(\d{4})', re.IGNORECASE), 'dmy_text'),
+    (re.compile(r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|des|agu|okt)\w*\s+(\d{1,2})\s+(\d{4})', re.IGNORECASE), 'mdy_text'),
+]
+
+# Singkatan bulan (Inggris & Indonesia) untuk format tanggal teks
+_MONTH_MAP = {
+    'jan':1, 'feb':2, 'mar':3, 'apr':4, 'may':5, 'jun':6,
+    'jul':7, 'aug':8, 'agu':8, 'sep':9, 'oct':10, 'okt':10,
+    'nov':11, 'dec':12, 'des':12
+}
+
+# Keyword baris yang bukan nama toko
+_MERCHANT_SKIP_RE = re.compile('|'.join(re.escape(kw) for kw in [
+    'jalan', 'jl.', 'jln', 'telp', 'hp', 'phone',
+    'email', '@', 'tanggal', 'date', 'alamat', 'address',
+    'receipt', 'struk', 'nota', 'bill', 'invoice', 'dine'
+]))
+
+# Merchant keywords untuk kategori
+_MERCHANT_KEYWORDS = {
+    'Makan': [
+        # Restaurant chains
+        'resto', 'restaurant', 'cafe', 'warung', 'makan', 'food', 
+        'kfc', 'mcd', 'mcdonald', 'pizza', 'burger', 'wendys',
+        'hoka', 'yoshinoya', 'hokben', 'solaria', 'breadtalk',
+        'starbucks', 'janji jiwa', 'kopi', 'coffee', 'kedai',
+        'master chef', 'chef',
+        # Food types
+        'bakso', 'mie', 'nasi', 'ayam', 'soto', 'sate', 'gado',
+        'padang', 'seafood', 'dapur', 'kitchen', 'catering'
+    ],
+    'Belanja': [
+        'mart', 'market', 'supermarket', 'indomaret', 'alfamart', 
+        'minimarket', 'hypermart', 'lottemart', 'carrefour', 'giant',
+        'shopee', 'tokopedia', 'lazada', 'blibli', 'bukalapak',
+        'store', 'shop', 'toko', 'mall', 'plaza'
+    ],
+    'Transport': [
+        'grab', 'gojek', 'uber', 'maxim', 'blue bird', 'bluebird',
+        'taxi', 'taksi', 'ojek', 'spbu', 'pertamina', 'shell', 
+        'total', 'bensin', 'parkir', 'parking', 'toll', 'tol'
+    ],
+    'Kesehatan': [
+        'apotek', 'pharmacy', 'apotik', 'rumah sakit', 'rs', 'hospital',
+        'klinik', 'clinic', 'guardian', 'century', 'kimia farma',
+        'viva health', 'dokter', 'medical', 'medis', 'lab', 'laboratorium'
+    ],
+    'Hiburan': [
+        'cinema', 'bioskop', 'xxi', 'cgv', 'cinepolis',
+        'gym', 'fitness', 'karaoke', 'timezone', 
+        'amazone', 'waterboom', 'theme park', 'taman'
+    ],
+    'Tagihan': [
+        'listrik', 'pln', 'token', 'telkom', 'indihome',
+        'xl', 'telkomsel', 'axis', 'three', 'smartfren',
+        'pulsa', 'pdam', 'air'
+    ]
+}
+
+
+def _build_merchant_index():
+    """Gabungkan keyword merchant jadi satu regex, urut prioritas kategori."""
+    keyword_rank = {}
+    for rank, keywords in enumerate(_MERCHANT_KEYWORDS.values()):
+        for keyword in keywords:
+            keyword_rank.setdefault(keyword, rank)
+    
+    # Lookahead supaya keyword yang saling tumpang tindih tetap terdeteksi
+    alternation = '|'.join(re.escape(kw) for kw in keyword_rank)
+    return re.compile(f'(?=({alternation}))'), keyword_rank, list(_MERCHANT_KEYWORDS)
+
+
+_MERCHANT_KEYWORD_RE, _MERCHANT_KEYWORD_RANK, _MERCHANT_CATEGORIES = _build_merchant_index()
 
-# Timezone Indonesia (WIB)
-WIB = timezone(timedelta(hours=7))
 
 class OCRProcessor:
     """Processor untuk OCR struk menggunakan Google Cloud Vision API"""
     
     def __init__(self):
+        # Hasil OCR per hash isi gambar, supaya foto yang dikirim ulang tidak memanggil Vision lagi
+        self._text_cache: OrderedDict = OrderedDict()
+        self._text_cache_lock = threading.Lock()
+        
         # ⚠️  OCR SEDANG DINONAKTIFKAN - MENCARI API OCR YANG LEBIH BAIK
         self.connected = False
-        print("⚠️  Google Cloud Vision API dinonaktifkan untuk sementara")
+        logger.warning("⚠️  Google Cloud Vision API dinonaktifkan untuk sementara")
         return
         
         try:
@@ -23,11 +135,11 @@ class OCRProcessor:
             # Initialize Vision API client
             self.client = vision.ImageAnnotatorClient()
             self.connected = True
-            print("✅ Google Cloud Vision API terhubung!")
+            logger.info("✅ Google Cloud Vision API terhubung!")
             
         except Exception as e:
-            print(f"❌ Error koneksi Vision API: {e}")
-            print("⚠️  Pastikan Cloud Vision API sudah di-enable di Google Cloud Console")
+            logger.error(f"❌ Error koneksi Vision API: {e}")
+            logger.warning("⚠️  Pastikan Cloud Vision API sudah di-enable di Google Cloud Console")
             self.connected = False
     
     def extract_text_from_image(self, image_path: str) -> str:
@@ -38,73 +150,79 @@ class OCRProcessor:
             return ""
         
         try:
-            # Read image file
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            content = Path(image_path).read_bytes()
+            
+            # Gambar yang sama persis sudah pernah di-OCR
+            digest = hashlib.blake2b(content, digest_size=16).digest()
+            cached = self._get_cached_text(digest)
+            if cached is not None:
+                return cached
             
             # Prepare image for Vision API
             image = vision.Image(content=content)
             
-            # Detect text dengan Vision API
-            response = self.client.text_detection(image=image)
-            texts = response.text_annotations
+            # Detect text dengan Vision API (mode dokumen, cocok untuk teks struk yang rapat)
+            response = self.client.document_text_detection(image=image)
             
             if response.error.message:
                 raise Exception(response.error.message)
             
-            # Ambil full text (index 0 = full text, sisanya per word)
-            if texts:
-                full_text = texts[0].description
-                print(f"📝 Vision OCR Result:\n{full_text}\n")
+            # Ambil full text hasil OCR
+            full_text = response.full_text_annotation.text
+            if full_text:
+                # Format lazy: teks hanya dirender jika level DEBUG aktif
+                logger.debug("📝 Vision OCR Result:\n%s", full_text)
+                self._cache_text(digest, full_text)
                 return full_text
             
             return ""
             
         except Exception as e:
-            print(f"❌ Error OCR: {e}")
+            logger.error(f"❌ Error OCR: {e}", exc_info=True)
             return ""
     
-    def extract_amount(self, text: str) -> Optional[float]:
+    def _get_cached_text(self, digest: bytes) -> Optional[str]:
+        """Text OCR dari cache untuk gambar dengan digest ini (None jika belum ada)"""
+        with self._text_cache_lock:
+            cached = self._text_cache.get(digest)
+            if cached is not None:
+                self._text_cache.move_to_end(digest)
+            return cached
+    
+    def _cache_text(self, digest: bytes, text: str):
+        """Simpan text OCR ke cache LRU (maks OCR_CACHE_SIZE gambar)"""
+        with self._text_cache_lock:
+            self._text_cache[digest] = text
+            if len(self._text_cache) > OCR_CACHE_SIZE:
+                self._text_cache.popitem(last=False)
+    
+    def extract_amount(self, text: str) -> Optional[int]:
         """
         Extract nominal uang dari text OCR
         Support berbagai format angka Indonesia
         """
         # Remove whitespace berlebih
         text = ' '.join(text.split())
-        text_lower = text.lower()
-        
-        # Pattern untuk mencari total/jumlah
-        patterns = [
-            # Total dengan label (prioritas tertinggi)
-            r'(?:^|\n)total[\s:]*(?:rp)?[\s.,]*(\d+[\d.,]*)',
-            r'(?:grand\s*total|jumlah|bayar)[\s:]*(?:rp)?[\s.,]*(\d+[\d.,]*)',
-            # Rp dengan angka
-            r'rp[\s.,]*(\d+[\d.,]*)',
-            # Angka dengan separator ribuan (titik atau koma)
-            r'(\d{1,3}(?:[.,]\d{3})+)',
-            # Angka biasa di atas 1000
-            r'\b(\d{4,})\b',
-        ]
+        text_lower = to_ascii_digits(text.lower())
         
-        amounts = []
+        # Nominal terbesar per jenis pattern
+        best = {}
         
-        for pattern in patterns:
-            matches = re.findall(pattern, text_lower, re.IGNORECASE | re.MULTILINE)
-            for match in matches:
-                # Clean: hapus separator ribuan
-                clean = match.replace('.', '').replace(',', '')
-                try:
-                    amount = float(clean)
-                    # Filter: minimal 1000, maksimal 100jt
-                    if 1000 <= amount <= 100_000_000:
-                        amounts.append(amount)
-                except:
-                    continue
+        for match in _AMOUNT_RE.finditer(text_lower):
+            # Clean: hapus separator ribuan
+            amount = int(match.group(match.lastgroup).replace('.', '').replace(',', ''))
+            
+            # Filter: minimal 1000, maksimal 100jt
+            if not 1000 <= amount <= 100_000_000:
+                continue
+            
+            if amount > best.get(match.lastgroup, 0):
+                best[match.lastgroup] = amount
         
-        # Return angka terbesar (biasanya total)
-        if amounts:
-            amounts.sort(reverse=True)
-            return amounts[0]
+        # Ambil dari jenis dengan prioritas tertinggi yang ditemukan
+        for group in _AMOUNT_GROUP_PRIORITY:
+            if group in best:
+                return best[group]
         
         return None
     
@@ -113,17 +231,20 @@ class OCRProcessor:
         Extract nama merchant/toko dari text
         Biasanya di baris pertama atau yang paling menonjol
         """
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
-        
-        if not lines:
-            return "Merchant"
-        
-        # Filter baris yang kemungkinan nama toko
-        candidates = []
+        checked = 0
         
-        for line in lines[:5]:  # Cek 5 baris pertama
+        for raw_line in text.split('\n'):
+            line = raw_line.strip()
+            if not line:
+                continue
+            
+            # Cek 5 baris pertama
+            checked += 1
+            if checked > 5:
+                break
+            
             # Skip jika ada terlalu banyak angka
-            digit_count = len(re.findall(r'\d', line))
+            digit_count = sum(map(str.isdecimal, line))
             if digit_count > len(line) * 0.4:
                 continue
             
@@ -132,36 +253,21 @@ class OCRProcessor:
                 continue
             
             # Skip keyword yang bukan nama toko
-            skip_keywords = ['jalan', 'jl.', 'jln', 'telp', 'hp', 'phone', 
-                           'email', '@', 'tanggal', 'date', 'alamat', 'address',
-                           'receipt', 'struk', 'nota', 'bill', 'invoice', 'dine']
-            if any(kw in line.lower() for kw in skip_keywords):
+            if _MERCHANT_SKIP_RE.search(line.lower()):
                 continue
             
-            candidates.append(line)
+            # Baris pertama yang lolos filter dianggap nama toko
+            return line
         
-        return candidates[0] if candidates else "Merchant"
+        return "Merchant"
     
     def extract_date(self, text: str) -> Optional[datetime]:
         """
         Extract tanggal dari struk
         Support berbagai format tanggal Indonesia & Internasional
         """
-        # Pattern untuk berbagai format tanggal
-        date_patterns = [
-            # DD/MM/YYYY, DD-MM-YYYY
-            (r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', 'dmy'),
-            # DD/MM/YY, DD-MM-YY
-            (r'(\d{1,2})[/-](\d{1,2})[/-](\d{2})\b', 'dmy2'),
-            # YYYY-MM-DD, YYYY/MM/DD
-            (r'(\d{4})[/-](\d{1,2})[/-](\d{1,2})', 'ymd'),
-            # DD Mon YYYY (25 Dec 2024, 25 Des 2024, Oct 23 2023)
-            (r'(\d{1,2})\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|des|agu|okt)\w*\s+(\d{4})', 'dmy_text'),
-            (r'(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|des|agu|okt)\w*\s+(\d{1,2})\s+(\d{4})', 'mdy_text'),
-        ]
-        
-        for pattern, format_type in date_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern, format_type in _DATE_PATTERNS:
+            match = pattern.search(text)
             if match:
                 try:
                     if format_type == 'dmy':
@@ -177,22 +283,12 @@ class OCRProcessor:
                         return datetime(int(year), int(month), int(day))
                     elif format_type == 'dmy_text':
                         day, month_str, year = match.groups()
-                        months = {
-                            'jan':1, 'feb':2, 'mar':3, 'apr':4, 'may':5, 'jun':6,
-                            'jul':7, 'aug':8, 'agu':8, 'sep':9, 'oct':10, 'okt':10,
-                            'nov':11, 'dec':12, 'des':12
-                        }
-                        month = months.get(month_str[:3].lower())
+                        month = _MONTH_MAP.get(month_str[:3].lower())
                         if month:
                             return datetime(int(year), month, int(day))
                     elif format_type == 'mdy_text':
                         month_str, day, year = match.groups()
-                        months = {
-                            'jan':1, 'feb':2, 'mar':3, 'apr':4, 'may':5, 'jun':6,
-                            'jul':7, 'aug':8, 'agu':8, 'sep':9, 'oct':10, 'okt':10,
-                            'nov':11, 'dec':12, 'des':12
-                        }
-                        month = months.get(month_str[:3].lower())
+                        month = _MONTH_MAP.get(month_str[:3].lower())
                         if month:
                             return datetime(int(year), month, int(day))
                 except:
@@ -207,51 +303,10 @@ class OCRProcessor:
         """
         merchant_lower = merchant.lower()
         
-        # Merchant keywords untuk kategori
-        category_keywords = {
-            'Makan': [
-                # Restaurant chains
-                'resto', 'restaurant', 'cafe', 'warung', 'makan', 'food', 
-                'kfc', 'mcd', 'mcdonald', 'pizza', 'burger', 'wendys',
-                'hoka', 'yoshinoya', 'hokben', 'solaria', 'breadtalk',
-                'starbucks', 'janji jiwa', 'kopi', 'coffee', 'kedai',
-                'master chef', 'chef',
-                # Food types
-                'bakso', 'mie', 'nasi', 'ayam', 'soto', 'sate', 'gado',
-                'padang', 'seafood', 'dapur', 'kitchen', 'catering'
-            ],
-            'Belanja': [
-                'mart', 'market', 'supermarket', 'indomaret', 'alfamart', 
-                'minimarket', 'hypermart', 'lottemart', 'carrefour', 'giant',
-                'shopee', 'tokopedia', 'lazada', 'blibli', 'bukalapak',
-                'store', 'shop', 'toko', 'mall', 'plaza'
-            ],
-            'Transport': [
-                'grab', 'gojek', 'uber', 'maxim', 'blue bird', 'bluebird',
-                'taxi', 'taksi', 'ojek', 'spbu', 'pertamina', 'shell', 
-                'total', 'bensin', 'parkir', 'parking', 'toll', 'tol'
-            ],
-            'Kesehatan': [
-                'apotek', 'pharmacy', 'apotik', 'rumah sakit', 'rs', 'hospital',
-                'klinik', 'clinic', 'guardian', 'century', 'kimia farma',
-                'viva health', 'dokter', 'medical', 'medis', 'lab', 'laboratorium'
-            ],
-            'Hiburan': [
-                'cinema', 'bioskop', 'xxi', 'cgv', 'cinepolis',
-                'gym', 'fitness', 'karaoke', 'timezone', 
-                'amazone', 'waterboom', 'theme park', 'taman'
-            ],
-            'Tagihan': [
-                'listrik', 'pln', 'token', 'telkom', 'indihome',
-                'xl', 'telkomsel', 'axis', 'three', 'smartfren',
-                'pulsa', 'pdam', 'air'
-            ]
-        }
+        ranks = [_MERCHANT_KEYWORD_RANK[m.group(1)] for m in _MERCHANT_KEYWORD_RE.finditer(merchant_lower)]
         
-        for category, keywords in category_keywords.items():
-            for keyword in keywords:
-                if keyword in merchant_lower:
-                    return category
+        if ranks:
+            return _MERCHANT_CATEGORIES[min(ranks)]
         
         return 'Lainnya'
     
@@ -282,8 +337,94 @@ class OCRProcessor:
             }
         
         # Extract text dari image
-        text = self.extract_text_from_image(image_path)
+        return self._build_receipt_result(self.extract_text_from_image(image_path))
+    
+    async def process_receipt_async(self, image_path: str) -> Dict:
+        """
+        Versi async process_receipt untuk handler bot
+        Baca file & panggilan Vision API jalan di thread supaya event loop tidak terblokir
+        """
+        if not self.connected:
+            return self.process_receipt(image_path)
+        
+        text = await asyncio.to_thread(self.extract_text_from_image, image_path)
+        return self._build_receipt_result(text)
+    
+    async def process_receipts_async(self, image_paths: List[str]) -> List[Dict]:
+        """
+        Versi async process_receipts (batch Vision API dijalankan di thread)
+        """
+        return await asyncio.to_thread(self.process_receipts, image_paths)
+    
+    def process_receipts(self, image_paths: List[str]) -> List[Dict]:
+        """
+        Process beberapa struk sekaligus (mis. album foto) dengan batch request Vision API
+        Hasil urut sesuai image_paths, formatnya sama dengan process_receipt
+        """
+        if not self.connected:
+            return [self.process_receipt(path) for path in image_paths]
+        
+        texts = []
+        # Vision membatasi jumlah gambar per batch_annotate_images
+        for start in range(0, len(image_paths), VISION_BATCH_SIZE):
+            texts += self.extract_texts_from_images(image_paths[start:start + VISION_BATCH_SIZE])
+        
+        return [self._build_receipt_result(text) for text in texts]
+    
+    def extract_texts_from_images(self, image_paths: List[str]) -> List[str]:
+        """
+        Extract text dari beberapa image dalam satu panggilan Vision API
+        Image yang gagal dibaca menghasilkan string kosong
+        """
+        texts = [""] * len(image_paths)
+        
+        # Hanya gambar yang terbaca dan belum ada di cache yang dikirim ke Vision
+        pending = []
+        for index, path in enumerate(image_paths):
+            try:
+                content = Path(path).read_bytes()
+            except OSError as e:
+                logger.error(f"❌ Tidak bisa membaca image {path}: {e}")
+                continue
+            
+            digest = hashlib.blake2b(content, digest_size=16).digest()
+            cached = self._get_cached_text(digest)
+            if cached is not None:
+                texts[index] = cached
+            else:
+                pending.append((index, digest, content))
         
+        if not pending:
+            return texts
+        
+        try:
+            requests = [
+                vision.AnnotateImageRequest(
+                    image=vision.Image(content=content),
+                    features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+                )
+                for _, _, content in pending
+            ]
+            response = self.client.batch_annotate_images(requests=requests)
+        except Exception as e:
+            logger.error(f"❌ Error OCR batch: {e}", exc_info=True)
+            return texts
+        
+        for (index, digest, _), result in zip(pending, response.responses):
+            if result.error.message:
+                logger.error(f"❌ Error OCR: {result.error.message}")
+                continue
+            full_text = result.full_text_annotation.text
+            if full_text:
+                self._cache_text(digest, full_text)
+                texts[index] = full_text
+        
+        return texts
+    
+    def _build_receipt_result(self, text: str) -> Dict:
+        """
+        Susun hasil process_receipt dari text OCR
+        """
         if not text:
             return {
                 'success': False,
@@ -307,6 +448,5 @@ class OCRProcessor:
             'raw_text': text
         }
 
-
 # Singleton instance
 ocr_processor = OCRProcessor()
\ No newline at end of file
@@ -1,11 +1,91 @@
 import re
-from datetime import datetime, timezone, timedelta
+import unicodedata
+from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Tuple
 from models.transaction import Transaction
 from config.settings import Config
+from config.constants import WIB, PARSE_CACHE_SIZE
 
-# Timezone Indonesia (WIB)
-WIB = timezone(timedelta(hours=7))
+
+def _build_keyword_index():
+    """Gabungkan semua keyword kategori jadi satu regex yang dipindai sekali jalan.
+    
+    Keyword diurutkan sesuai prioritas (pemasukan dulu, lalu kategori
+    pengeluaran sesuai urutan di Config) sehingga hasilnya sama dengan
+    mengecek keyword satu per satu.
+    """
+    groups = [('income', 'Pemasukan', Config.INCOME_KEYWORDS)]
+    groups += [('expense', category, keywords) for category, keywords in Config.EXPENSE_KEYWORDS.items()]
+    
+    keyword_rank = {}
+    for rank, (_, _, keywords) in enumerate(groups):
+        for keyword in keywords:
+            keyword_rank.setdefault(keyword.lower(), rank)
+    
+    # Lookahead supaya keyword yang saling tumpang tindih tetap terdeteksi
+    alternation = '|'.join(re.escape(kw) for kw in keyword_rank)
+    pattern = re.compile(f'(?=({alternation}))')
+    
+    return pattern, keyword_rank, [(tx_type, category) for tx_type, category, _ in groups]
+
+
+_KEYWORD_RE, _KEYWORD_RANK, _CATEGORY_BY_RANK = _build_keyword_index()
+
+# Pattern tanggal relatif & absolut (dikompilasi sekali saat import)
+_YESTERDAY_RE = re.compile(r'\bkemarin\b|\byesterday\b', re.IGNORECASE)
+_DAYS_AGO_RE = re.compile(r'(\d+)\s*(?:hari\s*(?:yang\s*)?)?lalu', re.IGNORECASE)
+_INDO_DAYS_AGO_RE = re.compile(
+    r'(satu|dua|tiga|empat|lima|enam|tujuh|delapan|sembilan|sepuluh|sebelas|dua\s+belas)\s+(?:hari\s*(?:yang\s*)?)?lalu',
+    re.IGNORECASE
+)
+_LAST_WEEK_RE = re.compile(r'minggu\s*(?:lalu|kemarin)|last\s*week', re.IGNORECASE)
+_LAST_MONTH_RE = re.compile(r'bulan\s*(?:lalu|kemarin)|last\s*month', re.IGNORECASE)
+_DATE_RE = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})')
+
+# Gabungan pattern tanggal untuk extract_date, urut prioritas. Lookahead supaya
+# pattern yang tumpang tindih tetap terlihat; grup bernama menandai jenisnya
+_DATE_KINDS = {
+    'yesterday': _YESTERDAY_RE,
+    'days_ago': _DAYS_AGO_RE,
+    'indo_days_ago': _INDO_DAYS_AGO_RE,
+    'last_week': _LAST_WEEK_RE,
+    'last_month': _LAST_MONTH_RE,
+    'date': _DATE_RE,
+}
+_DATE_KIND_RANK = {kind: rank for rank, kind in enumerate(_DATE_KINDS)}
+_DATE_KEYWORDS_RE = re.compile(
+    '(?=' + '|'.join(f'(?P<{kind}>{p.pattern})' for kind, p in _DATE_KINDS.items()) + ')',
+    re.IGNORECASE
+)
+
+def to_ascii_digits(text: str) -> str:
+    """Ubah digit Unicode (mis. full-width "５００", Arab-Indic) ke 0-9 supaya cocok dengan pattern re.ASCII."""
+    if text.isascii():
+        return text
+    return ''.join(str(unicodedata.decimal(ch)) if ch.isdecimal() else ch for ch in text)
+
+
+# Pattern nominal (jutaan, ribuan, angka biasa). re.ASCII: \d cukup 0-9,
+# digit lain dinormalisasi dulu lewat to_ascii_digits
+_ANY_DIGIT_RE = re.compile(r'[0-9]')
+_JUTA_RE = re.compile(r'(\d+\.?\d*)\s*(?:jt|juta)', re.ASCII)
+_RIBU_RE = re.compile(r'(\d+\.?\d*)\s*(?:k\b|rb|ribu)', re.ASCII)
+_PLAIN_AMOUNT_RE = re.compile(r'\b(\d{3,})\b', re.ASCII)
+
+# Pattern pembersih keterangan: tanggal dihapus dulu, baru angka dengan satuan/angka biasa
+_DATE_WORDS_RE = re.compile(
+    '|'.join(p.pattern for p in (
+        _YESTERDAY_RE, _DAYS_AGO_RE, _INDO_DAYS_AGO_RE, _LAST_WEEK_RE, _LAST_MONTH_RE, _DATE_RE,
+    )),
+    re.IGNORECASE
+)
+# Tanpa re.ASCII: digit non-ASCII juga ikut dihapus dari keterangan
+_AMOUNT_WORDS_RE = re.compile(
+    r'\d+\.?\d*\s*(?:jt|juta|k|rb|ribu)|' + _PLAIN_AMOUNT_RE.pattern,
+    re.IGNORECASE
+)
+_WHITESPACE_RE = re.compile(r'\s+')
 
 class MessageParser:
     """Parser untuk mengekstrak informasi dari pesan."""
@@ -20,162 +100,166 @@ class MessageParser:
     @staticmethod
     def parse_indonesian_number(text: str) -> Optional[int]:
         """Parse angka dari bahasa Indonesia."""
-        text_lower = text.lower().strip()
-        
-        # Check long numbers first (e.g., "dua belas")
-        for words, num in MessageParser.INDONESIAN_NUMBERS.items():
-            if text_lower == words:
-                return num
-        
-        return None
+        # Rapikan spasi supaya "dua  belas" tetap cocok dengan "dua belas"
+        return MessageParser.INDONESIAN_NUMBERS.get(' '.join(text.lower().split()))
     
     @staticmethod
-    def extract_date(text: str) -> Optional[datetime]:
+    def extract_date(text: str, text_lower: Optional[str] = None) -> Optional[datetime]:
         """Ekstrak tanggal dari pesan (kemarin, 2 hari lalu, atau format tanggal)."""
-        text_lower = text.lower()
-        now = datetime.now(tz=WIB)
+        if text_lower is None:
+            text_lower = text.lower()
+        
+        # Satu kali pindai untuk semua pattern, ambil jenis dengan prioritas tertinggi
+        match = None
+        for candidate in _DATE_KEYWORDS_RE.finditer(text_lower):
+            if match is None or _DATE_KIND_RANK[candidate.lastgroup] < _DATE_KIND_RANK[match.lastgroup]:
+                match = candidate
+                # "kemarin" sudah prioritas tertinggi
+                if match.lastgroup == 'yesterday':
+                    break
+        
+        if match is None:
+            return None
+        
+        kind = match.lastgroup
+        matched = match.group(kind)
+        midnight = datetime.now(tz=WIB).replace(hour=0, minute=0, second=0)
         
         # Pattern: "kemarin", "yesterday"
-        if re.search(r'\bkemarin\b|\byesterday\b', text_lower):
-            result = now.replace(hour=0, minute=0, second=0) - timedelta(days=1)
-            return result
+        if kind == 'yesterday':
+            return midnight - timedelta(days=1)
         
         # Pattern: "N hari yang lalu" atau "N hari lalu", "N days ago" (dengan angka)
-        days_match = re.search(r'(\d+)\s*(?:hari\s*(?:yang\s*)?)?lalu', text_lower)
-        if days_match:
-            days = int(days_match.group(1))
-            result = now.replace(hour=0, minute=0, second=0) - timedelta(days=days)
-            return result
+        if kind == 'days_ago':
+            days = int(_DAYS_AGO_RE.match(matched).group(1))
+            return midnight - timedelta(days=days)
         
         # Pattern: "kata_angka hari yang lalu" atau "kata_angka hari lalu" (dengan bahasa Indonesia)
         # Contoh: "dua hari yang lalu", "tiga hari lalu", "lima hari yang lalu"
-        indo_days_match = re.search(r'(satu|dua|tiga|empat|lima|enam|tujuh|delapan|sembilan|sepuluh|sebelas|dua\s+belas)\s+(?:hari\s*(?:yang\s*)?)?lalu', text_lower)
-        if indo_days_match:
-            days_word = indo_days_match.group(1)
-            days = MessageParser.parse_indonesian_number(days_word)
+        if kind == 'indo_days_ago':
+            days = MessageParser.parse_indonesian_number(_INDO_DAYS_AGO_RE.match(matched).group(1))
             if days:
-                result = now.replace(hour=0, minute=0, second=0) - timedelta(days=days)
-                return result
+                return midnight - timedelta(days=days)
+            return None
         
         # Pattern: "minggu lalu", "minggu kemarin", "last week" (7 hari lalu)
-        if re.search(r'minggu\s*(?:lalu|kemarin)|last\s*week', text_lower):
-            result = now.replace(hour=0, minute=0, second=0) - timedelta(days=7)
-            return result
+        if kind == 'last_week':
+            return midnight - timedelta(days=7)
         
         # Pattern: "bulan lalu", "last month" (30 hari lalu)
-        if re.search(r'bulan\s*(?:lalu|kemarin)|last\s*month', text_lower):
-            result = now.replace(hour=0, minute=0, second=0) - timedelta(days=30)
-            return result
+        if kind == 'last_month':
+            return midnight - timedelta(days=30)
         
         # Pattern: tanggal format DD/MM/YYYY atau DD-MM-YYYY
-        date_match = re.search(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', text)
-        if date_match:
-            try:
-                day = int(date_match.group(1))
-                month = int(date_match.group(2))
-                year = int(date_match.group(3))
-                # Buat datetime dengan waktu pukul 00:00:00
-                parsed_date = datetime(year, month, day, 
-                                      hour=0, minute=0, second=0, 
-                                      tzinfo=WIB)
-                return parsed_date
-            except ValueError:
-                pass
+        date_match = _DATE_RE.match(matched)
+        try:
+            day = int(date_match.group(1))
+            month = int(date_match.group(2))
+            year = int(date_match.group(3))
+            # Buat datetime dengan waktu pukul 00:00:00
+            return datetime(year, month, day, 
+                            hour=0, minute=0, second=0, 
+                            tzinfo=WIB)
+        except ValueError:
+            pass
         
         # Tidak ada tanggal ditemukan
         return None
     
     @staticmethod
-    def clean_text_from_date(text: str) -> str:
-        """Hapus pattern tanggal dari teks untuk cleaning description."""
-        # Hapus "kemarin", "N hari lalu", dll
-        text = re.sub(r'\bkemarin\b|\byesterday\b', '', text, flags=re.IGNORECASE)
-        # Hapus "N hari lalu" atau "N hari yang lalu" (angka)
-        text = re.sub(r'\d+\s*(?:hari\s*(?:yang\s*)?)?lalu', '', text, flags=re.IGNORECASE)
-        # Hapus "kata_angka hari lalu" (bahasa Indonesia)
-        text = re.sub(r'(satu|dua|tiga|empat|lima|enam|tujuh|delapan|sembilan|sepuluh|sebelas|dua\s+belas)\s+(?:hari\s*(?:yang\s*)?)?lalu', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'minggu\s*(?:lalu|kemarin)|last\s*week', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'bulan\s*(?:lalu|kemarin)|last\s*month', '', text, flags=re.IGNORECASE)
-        # Hapus format tanggal
-        text = re.sub(r'\d{1,2}[/-]\d{1,2}[/-]\d{4}', '', text)
-        return text
-    
-    @staticmethod
-    def extract_amount(text: str) -> Optional[float]:
-        """Ambil nominal uang (format: 15000, 15rb/k, 1.5jt, 1,5jt)."""
-        text = text.lower().replace(',', '.')
+    def extract_amount(text: str, text_lower: Optional[str] = None) -> Optional[int]:
+        """Ambil nominal uang dalam rupiah utuh (format: 15000, 15rb/k, 1.5jt, 1,5jt)."""
+        if text_lower is None:
+            text_lower = text.lower()
+        text_lower = to_ascii_digits(text_lower)
+        # Tanpa angka sama sekali pasti tidak ada nominal
+        if not _ANY_DIGIT_RE.search(text_lower):
+            return None
+        
+        text = text_lower.replace(',', '.')
         
         # Pattern untuk jutaan (1.5jt, 2jt, 1.5juta, 5jt)
-        juta_match = re.search(r'(\d+\.?\d*)\s*(?:jt|juta)', text)
+        juta_match = _JUTA_RE.search(text)
         if juta_match:
-            return float(juta_match.group(1)) * 1_000_000
+            return round(float(juta_match.group(1)) * 1_000_000)
         
         # Pattern untuk ribuan (15k, 15rb, 15ribu)
-        ribu_match = re.search(r'(\d+\.?\d*)\s*(?:k\b|rb|ribu)', text)
+        ribu_match = _RIBU_RE.search(text)
         if ribu_match:
-            return float(ribu_match.group(1)) * 1_000
+            return round(float(ribu_match.group(1)) * 1_000)
         
         # Pattern untuk angka biasa (5000, 15000, 250000)
         # Cari angka dengan minimal 3 digit (asumsi uang minimal 100)
-        angka_match = re.search(r'\b(\d{3,})\b', text)
+        angka_match = _PLAIN_AMOUNT_RE.search(text)
         if angka_match:
-            return float(angka_match.group(1))
+            return int(angka_match.group(1))
         
         return None
     
     @staticmethod
-    def detect_category(text: str) -> Tuple[str, str]:
+    def detect_category(text: str, text_lower: Optional[str] = None) -> Tuple[str, str]:
         """Deteksi tipe transaksi dan kategori."""
-        text = text.lower()
+        if text_lower is None:
+            text_lower = text.lower()
+        ranks = [_KEYWORD_RANK[m.group(1)] for m in _KEYWORD_RE.finditer(text_lower)]
         
-        # Check income keywords dulu
-        for keyword in Config.INCOME_KEYWORDS:
-            if keyword in text:
-                return 'income', 'Pemasukan'
-        
-        # Check expense categories
-        for category, keywords in Config.EXPENSE_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in text:
-                    return 'expense', category
+        if ranks:
+            return _CATEGORY_BY_RANK[min(ranks)]
         
         # Default: expense dengan kategori Lainnya
         return 'expense', 'Lainnya'
     
     @staticmethod
-    def clean_description(text: str, amount: float) -> str:
+    def clean_description(text: str, amount: int) -> str:
         """Bersihkan teks keterangan dari angka/satuan dan tanggal."""
         # Hapus pattern tanggal dulu
-        text = MessageParser.clean_text_from_date(text)
-        # Hapus pattern angka dengan satuan
-        text = re.sub(r'\d+\.?\d*\s*(?:jt|juta|k|rb|ribu)', '', text, flags=re.IGNORECASE)
-        # Hapus angka biasa
-        text = re.sub(r'\b\d{3,}\b', '', text)
+        text = _DATE_WORDS_RE.sub('', text)
+        # Hapus angka dengan satuan dan angka biasa
+        text = _AMOUNT_WORDS_RE.sub('', text)
         # Bersihkan whitespace berlebih
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WHITESPACE_RE.sub(' ', text).strip()
         
         return text if text else 'Transaksi'
     
     @staticmethod
-    def parse_message(text: str, custom_date: Optional[datetime] = None) -> Optional[Transaction]:
-        """Parse pesan menjadi objek Transaction.
+    @lru_cache(maxsize=PARSE_CACHE_SIZE)
+    def _parse_fields(text: str) -> Optional[Tuple[int, str, str, str]]:
+        """Parse bagian yang hanya bergantung pada teks (di-cache, pesan sering berulang).
         
-        Args:
-            text: Pesan dari user
-            custom_date: Tanggal custom (jika ada), jika tidak ada akan di-parse dari text
+        Tanggal tidak ikut di-cache karena "kemarin" dll relatif terhadap hari ini.
         """
+        # Lowercase cukup sekali, dipakai ulang oleh semua helper
+        text_lower = text.lower()
+        
         # Extract amount
-        amount = MessageParser.extract_amount(text)
+        amount = MessageParser.extract_amount(text, text_lower)
         
         if not amount:
             return None
         
         # Detect type & category
-        transaction_type, category = MessageParser.detect_category(text)
+        transaction_type, category = MessageParser.detect_category(text, text_lower)
         
         # Clean description
         description = MessageParser.clean_description(text, amount)
         
+        return amount, transaction_type, category, description
+    
+    @staticmethod
+    def parse_message(text: str, custom_date: Optional[datetime] = None) -> Optional[Transaction]:
+        """Parse pesan menjadi objek Transaction.
+        
+        Args:
+            text: Pesan dari user
+            custom_date: Tanggal custom (jika ada), jika tidak ada akan di-parse dari text
+        """
+        fields = MessageParser._parse_fields(text)
+        
+        if fields is None:
+            return None
+        
+        amount, transaction_type, category, description = fields
+        
         # Tentukan tanggal
         if custom_date:
             transaction_date = custom_date
@@ -183,11 +267,11 @@ class MessageParser:
             # Coba ekstrak dari text, jika tidak ada gunakan sekarang
             transaction_date = MessageParser.extract_date(text) or datetime.now(tz=WIB)
         
-        # Buat Transaction object
+        # Buat Transaction object (selalu baru, karena saldo diisi per transaksi)
         return Transaction(
             amount=amount,
             transaction_type=transaction_type,
             category=category,
             description=description,
             date=transaction_date
-        )
\ No newline at end of file
+        )
@@ -1,12 +1,65 @@
+import json
 import logging
+import random
+import re
+import threading
+import time
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from typing import Optional
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import List, Optional
 from models.transaction import Transaction
 from config.settings import Config
+from config.constants import (
+    CACHE_TIMEOUT_SECONDS,
+    SHEETS_HTTP_POOL_SIZE,
+    SHEETS_RETRY_ATTEMPTS,
+    SHEETS_RETRY_DELAY_SECONDS,
+)
 
 logger = logging.getLogger(__name__)
 
+SHEET_HEADERS = ['Tanggal', 'Waktu', 'Tipe', 'Kategori', 'Jumlah', 'Keterangan', 'Saldo']
+
+# Nomor baris terakhir dari updatedRange, mis. "'Sheet1'!A10:H12" -> 12
+_RANGE_LAST_ROW_RE = re.compile(r'(\d+)$')
+# Status yang pasti belum menulis baris, aman untuk append ulang
+_APPEND_RETRY_STATUSES = (429, 503)
+
+# Saldo yang diketik manual: awalan mata uang/spasi, dan titik sebagai pemisah ribuan
+_CURRENCY_RE = re.compile(r'rp\.?|idr|\s', re.IGNORECASE)
+_DOT_THOUSANDS_RE = re.compile(r'-?\d{1,3}(?:\.\d{3})+')
+
+
+def _parse_balance_text(text: str) -> float:
+    """Ubah saldo yang diketik manual ("Rp 1,500", "Rp. 150.000", "1.500.000,00") ke float.
+    
+    ValueError jika formatnya tidak dikenali.
+    """
+    text = _CURRENCY_RE.sub('', text)
+    if ',' in text and '.' in text:
+        # Pemisah yang muncul terakhir adalah desimal
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        # Hanya koma: pemisah ribuan
+        text = text.replace(',', '')
+    elif _DOT_THOUSANDS_RE.fullmatch(text):
+        text = text.replace('.', '')
+    return float(text)
+
+
+def _updated_last_row(response) -> Optional[int]:
+    """Ambil baris terakhir yang ditulis append_rows dari respons API."""
+    try:
+        match = _RANGE_LAST_ROW_RE.search(response['updates']['updatedRange'])
+    except (TypeError, KeyError):
+        return None
+    return int(match.group(1)) if match else None
+
 class GoogleSheetsManager:
     """Pengelola operasi Google Sheets."""
     
@@ -14,7 +67,25 @@ class GoogleSheetsManager:
         self.client = None
         self.sheet = None
         self.connected = False
-        self._connect()
+        
+        # Saldo disimpan di memori supaya tidak membaca kolom saldo tiap pesan
+        self._cached_balance: Optional[float] = None
+        self._balance_loaded_at = 0.0
+        self._unflushed = 0  # transaksi yang saldonya sudah dihitung tapi belum tertulis
+        self._last_balance_row: Optional[int] = None  # baris terakhir yang berisi saldo
+        self._balance_lock = threading.Lock()
+        
+        # Koneksi dibuat saat pertama dibutuhkan, bukan saat import
+        self._connect_lock = threading.Lock()
+        self._connect_attempted = False
+    
+    def ensure_connected(self) -> bool:
+        """Hubungkan ke Google Sheets sekali saat pertama dibutuhkan, True jika terhubung."""
+        with self._connect_lock:
+            if not self._connect_attempted:
+                self._connect_attempted = True
+                self._connect()
+        return self.connected
     
     def _connect(self):
         """Bangun koneksi ke Google Sheets."""
@@ -24,12 +95,14 @@ class GoogleSheetsManager:
                 'https://www.googleapis.com/auth/drive'
             ]
             
-            creds = ServiceAccountCredentials.from_json_keyfile_name(
+            # google-auth me-refresh token sendiri sebelum kedaluwarsa
+            creds = Credentials.from_service_account_file(
                 Config.SHEETS_CREDS_FILE, 
-                scope
+                scopes=scope
             )
             
             self.client = gspread.authorize(creds)
+            self._tune_session()
             
             # Buka spreadsheet by ID
             spreadsheet = self.client.open_by_key(Config.SPREADSHEET_ID)
@@ -47,71 +120,211 @@ class GoogleSheetsManager:
             logger.error(f"❌ Error koneksi ke Google Sheets: {e}", exc_info=True)
             self.connected = False
     
+    def _tune_session(self):
+        """Pakai pool koneksi keep-alive + retry otomatis untuk error sementara (429/5xx)."""
+        # POST (append_rows) tidak di-retry di level HTTP supaya baris tidak tertulis dobel
+        retry = Retry(
+            total=SHEETS_RETRY_ATTEMPTS,
+            backoff_factor=SHEETS_RETRY_DELAY_SECONDS,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False,  # respons terakhir tetap diproses gspread (APIError)
+        )
+        adapter = HTTPAdapter(
+            pool_connections=SHEETS_HTTP_POOL_SIZE,
+            pool_maxsize=SHEETS_HTTP_POOL_SIZE,
+            max_retries=retry,
+        )
+        self.client.session.mount('https://', adapter)
+    
+    def _header_is_cached(self) -> bool:
+        """Cek penanda lokal bahwa header spreadsheet ini sudah pernah dipastikan ada."""
+        try:
+            with open(Config.SHEETS_HEADER_CACHE_FILE, encoding='utf-8') as f:
+                marker = json.load(f)
+        except (OSError, ValueError):
+            return False
+        return marker == {'spreadsheet_id': Config.SPREADSHEET_ID, 'headers': SHEET_HEADERS}
+    
+    def _cache_header_ok(self):
+        """Simpan penanda header supaya start berikutnya tidak perlu cek ke API."""
+        try:
+            with open(Config.SHEETS_HEADER_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({'spreadsheet_id': Config.SPREADSHEET_ID, 'headers': SHEET_HEADERS}, f)
+        except OSError as e:
+            logger.warning(f"Tidak bisa menyimpan penanda header: {e}")
+    
     def _setup_header(self):
         """Buat header di baris pertama bila belum tersedia."""
+        if self._header_is_cached():
+            return
+        
         try:
             first_row = self.sheet.row_values(1)
             
             if not first_row or first_row[0] != 'Tanggal':
-                headers = ['Tanggal', 'Waktu', 'Tipe', 'Kategori', 'Jumlah', 'Keterangan', 'Saldo']
-                self.sheet.update('A1:G1', [headers])
-                self.sheet.format('A1:G1', {
-                    'textFormat': {'bold': True},
-                    'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9}
-                })
+                # Isi header + format dalam satu batchUpdate
+                header_range = {
+                    'sheetId': self.sheet.id,
+                    'startRowIndex': 0,
+                    'endRowIndex': 1,
+                    'startColumnIndex': 0,
+                    'endColumnIndex': len(SHEET_HEADERS)
+                }
+                self.sheet.spreadsheet.batch_update({'requests': [
+                    {'updateCells': {
+                        'range': header_range,
+                        'rows': [{'values': [
+                            {'userEnteredValue': {'stringValue': header}} for header in SHEET_HEADERS
+                        ]}],
+                        'fields': 'userEnteredValue'
+                    }},
+                    {'repeatCell': {
+                        'range': header_range,
+                        'cell': {'userEnteredFormat': {
+                            'textFormat': {'bold': True},
+                            'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9}
+                        }},
+                        'fields': 'userEnteredFormat(textFormat,backgroundColor)'
+                    }}
+                ]})
                 
                 logger.info("📋 Header berhasil dibuat!")
+            
+            self._cache_header_ok()
         except Exception as e:
             logger.warning(f"Tidak bisa setup header: {e}")
     
     def add_transaction(self, transaction: Transaction) -> bool:
         """Tambah transaksi ke Google Sheets, True jika berhasil."""
-        if not self.connected:
+        return self.add_transactions([transaction])
+    
+    def add_transactions(self, transactions: List[Transaction]) -> bool:
+        """Tambah banyak transaksi sekaligus dalam satu append_rows, True jika berhasil."""
+        if not self.ensure_connected():
             logger.error("❌ Tidak terhubung ke Google Sheets")
             return False
         
+        if not transactions:
+            return True
+        
+        for transaction in transactions:
+            if transaction.balance is None:
+                self.reserve_balance(transaction)
+        
         try:
-            data = transaction.to_dict()
-            
-            current_balance = self._get_current_balance()
-            
-            if transaction.transaction_type == 'income':
-                new_balance = current_balance + transaction.amount
-            else:
-                new_balance = current_balance - transaction.amount
-            
-            amount_display = transaction.amount if transaction.transaction_type == 'income' else -transaction.amount
-            
-            row = [
-                data['date'],
-                data['time'],
-                data['type'],
-                data['category'],
-                amount_display,
-                data['description'],
-                data['detail'],
-                new_balance
-            ]
+            rows = [transaction.to_row() for transaction in transactions]
             
-            self.sheet.append_row(row)
+            response = self._append_with_retry(rows)
             
-            logger.info(f"✅ Transaksi berhasil ditambahkan: Rp {transaction.amount:,.0f} | Saldo: Rp {new_balance:,.0f}")
+            with self._balance_lock:
+                self._unflushed -= len(transactions)
+                self._last_balance_row = _updated_last_row(response)
+            
+            logger.info(f"✅ {len(rows)} transaksi berhasil ditambahkan | Saldo: Rp {transactions[-1].balance:,.0f}")
             
             return True
             
         except Exception as e:
             logger.error(f"❌ Error saat menyimpan ke sheets: {e}", exc_info=True)
+            # Transaksi tetap dihitung belum tertulis (_unflushed) karena writer
+            # akan mengirim ulang batch yang sama; saldo cache sudah memuatnya
+            return False
+    
+    def _append_with_retry(self, rows: list):
+        """append_rows dengan backoff eksponensial bila kena rate limit / layanan sibuk."""
+        for attempt in range(1, SHEETS_RETRY_ATTEMPTS + 1):
+            try:
+                return self.sheet.append_rows(rows)
+            except gspread.exceptions.APIError as e:
+                if e.response.status_code not in _APPEND_RETRY_STATUSES or attempt == SHEETS_RETRY_ATTEMPTS:
+                    raise
+                delay = SHEETS_RETRY_DELAY_SECONDS * 2 ** (attempt - 1) + random.uniform(0, 1)
+                logger.warning(
+                    f"⏳ Sheets membalas {e.response.status_code}, coba lagi dalam {delay:.1f} detik "
+                    f"({attempt}/{SHEETS_RETRY_ATTEMPTS})"
+                )
+                time.sleep(delay)
+    
+    def _balance_is_stale(self) -> bool:
+        """Cek apakah saldo di cache perlu dimuat ulang dari sheet."""
+        if self._cached_balance is None:
+            return True
+        # Jangan reload selama masih ada transaksi yang belum tertulis
+        if self._unflushed > 0:
             return False
+        return time.monotonic() - self._balance_loaded_at > CACHE_TIMEOUT_SECONDS
+    
+    def _load_balance(self):
+        """Muat saldo dari sheet ke cache bila sudah kedaluwarsa (panggil dengan lock)."""
+        if self._balance_is_stale():
+            self._cached_balance = self._get_current_balance()
+            self._balance_loaded_at = time.monotonic()
+    
+    def reserve_balance(self, transaction: Transaction) -> float:
+        """Hitung saldo setelah transaksi dari cache dan catat di transaksi."""
+        with self._balance_lock:
+            self._load_balance()
+            
+            self._cached_balance += transaction.signed_amount
+            
+            self._unflushed += 1
+            transaction.balance = self._cached_balance
+            return self._cached_balance
+    
+    def release_balance(self, transaction: Transaction):
+        """Batalkan reserve_balance untuk transaksi yang gagal masuk antrian penulisan."""
+        with self._balance_lock:
+            if self._cached_balance is not None:
+                self._cached_balance -= transaction.signed_amount
+            self._unflushed -= 1
+            transaction.balance = None
+    
+    def restore_pending(self, transactions: List[Transaction]):
+        """Hitung ulang saldo transaksi dari jurnal (urut id) mulai dari saldo sheet saat ini.
+        
+        Saldo yang tersimpan di jurnal bisa sudah basi, jadi tidak dipakai. Dipanggil
+        saat start sebelum ada transaksi baru, supaya urutan saldo sama dengan urutan baris.
+        """
+        for transaction in transactions:
+            transaction.balance = None
+        
+        # Tanpa koneksi saldo tidak bisa dihitung; add_transactions akan
+        # menghitungnya saat baris benar-benar dikirim
+        if not self.ensure_connected():
+            return
+        
+        for transaction in transactions:
+            self.reserve_balance(transaction)
     
     def _get_current_balance(self) -> float:
-        """Ambil saldo terakhir dari kolom saldo."""
+        """Ambil saldo terakhir dari kolom saldo.
+        
+        Bila baris saldo terakhir sudah diketahui, cukup baca dari baris itu ke bawah
+        (biasanya satu sel, plus baris yang ditambah manual); selain itu baca satu kolom.
+        """
         try:
-            saldo_col = self.sheet.col_values(8)
-            if len(saldo_col) > 1:
-                last_balance = saldo_col[-1]
+            values, first_row = [], 1
+            if self._last_balance_row:
+                first_row = self._last_balance_row
+                values = self.sheet.get(f'H{first_row}:H', value_render_option='UNFORMATTED_VALUE')
+            if not values:
+                # Belum diketahui, atau baris sudah dihapus: baca ulang satu kolom
+                first_row = 1
+                values = self.sheet.get('H:H', value_render_option='UNFORMATTED_VALUE')
+            
+            last_row = first_row + len(values) - 1
+            self._last_balance_row = last_row if values else None
+            
+            # Baris 1 adalah header
+            if last_row > 1 and values[-1]:
+                last_balance = values[-1][0]
+                # UNFORMATTED_VALUE mengembalikan angka; string hanya jika diisi manual
+                if isinstance(last_balance, (int, float)):
+                    return float(last_balance)
                 try:
-                    return float(str(last_balance).replace(',', ''))
-                except:
+                    return _parse_balance_text(str(last_balance))
+                except ValueError:
+                    logger.warning(f"⚠️ Saldo terakhir tidak bisa dibaca: {last_balance!r}, dianggap 0")
                     return 0.0
             
             return 0.0
@@ -125,12 +338,14 @@ class GoogleSheetsManager:
         pass
     
     def get_balance(self) -> float:
-        """Get saldo terkini"""
-        if not self.connected:
+        """Get saldo terkini (dari cache, dimuat ulang tiap CACHE_TIMEOUT_SECONDS)"""
+        if not self.ensure_connected():
             return 0.0
         
-        return self._get_current_balance()
+        with self._balance_lock:
+            self._load_balance()
+            return self._cached_balance
 
 
-# Singleton instance
+# Singleton instance (belum terhubung sampai ensure_connected dipanggil)
 sheets_manager = GoogleSheetsManager()
\ No newline at end of file